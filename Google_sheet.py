@@ -1,29 +1,22 @@
 from KG_Faiss_Query_3068 import query_faiss
 from define_case_type import get_case_type
-from Neo4j_Query import get_siminput_case,get_simoutput_case
-from googleapiclient.discovery import build
-from google.oauth2.service_account import Credentials
+from Neo4j_Query import get_cases
+from resources import get_sheets
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Google Sheets API 配置
-SERVICE_ACCOUNT_FILE = os.getenv("PATH_TO_GOOGLE_JSON")
-SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+# Google Sheets 客户端由 resources.get_sheets 在第一次使用时建立
 
 # 试算表 ID 和范围
 SPREADSHEET_ID = os.getenv("SPREADSHEET_ID_B")
 RANGE_READ = 'Sheet1!A:A'  # 读取 A 栏
 RANGE_WRITE_START = 'Sheet1!B1'  # 从 B1 开始写入
 
-# 初始化 Google Sheets 客户端
-creds = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-service = build('sheets', 'v4', credentials=creds)
-sheet = service.spreadsheets()
-
 # 读取试算表数据并逐条生成结果
 def read_and_write_sheets():
+    sheet = get_sheets()
     # 读取 A 栏数据
     result = sheet.values().get(spreadsheetId=SPREADSHEET_ID, range=RANGE_READ).execute()
     values = result.get("values", [])
@@ -46,9 +39,10 @@ def read_and_write_sheets():
             c = [str(x) for x in case_ids]
             case_ids_str = ",".join(c)
             print(case_ids_str)
-            # 获取对应的模拟输入
-            sim_inputs = [get_siminput_case(int(case_id)) for case_id in case_ids]
-            sim_outputs = [get_simoutput_case(int(case_id)) for case_id in case_ids]
+            # 以一次查询获取对应的模拟输入与模拟输出
+            cases = get_cases(case_ids)
+            sim_inputs = [case["siminput"] for case in cases]
+            sim_outputs = [case["simoutput"] for case in cases]
             # 准备写入的数据
             write_values = [[case_ids_str, sim_inputs[0], sim_inputs[1], sim_inputs[2], sim_outputs[0], sim_outputs[1], sim_outputs[2]]]
         except Exception as e:
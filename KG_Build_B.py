@@ -1,182 +1,262 @@
-from neo4j import GraphDatabase
 from dotenv import load_dotenv
-from input_filter import generate_filter
-from define_case_type import get_case_type
-import pandas as pd
+from define_case_type import classify_case, case_type_from_info, format_case_info
+from build_pipeline import iter_excel_rows, run_pipeline
+from build_metrics import StageMetrics
+from resources import close_all, get_driver
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import argparse
+import hashlib
+import logging
 import os
 import re
-import time
 
 # 載入 .env 檔案中的環境變數
 load_dotenv()
 
-# 連接到 Neo4j 資料庫，請確保 .env 中定義了 NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD
-uri = os.getenv("NEO4J_URI_3068")
-username = os.getenv("NEO4J_USERNAME")
-password = os.getenv("NEO4J_PASSWORD_3068")
-driver = GraphDatabase.driver(uri, auth=(username, password))
-
-# 建立或合併 案件類型 節點
-def merge_case_type(tx, case_type):
-    tx.run("MERGE (t:案件類型 {name: $case_type})", case_type=case_type)
-    print(f"建立或合併案件類型節點：{case_type}")
-
-# 建立 案件 節點，並存入模擬輸入與模擬輸出作屬性
-def create_case_node(tx, case_id):
-    tx.run("CREATE (c:案件 {case_id: $case_id})",
-           case_id = case_id)
-    print(f"建立案件節點，ID:{case_id}")
-
-# 將 案件 節點連結到對應的 案件類型 節點
-def link_case_to_case_type(tx, case_type, case_id):
-    tx.run(
-        "MATCH (t:案件類型 {name: $case_type}), (c:案件 {case_id: $case_id}) "
-        "MERGE (t)-[:所屬案件]->(c)",
-        case_type=case_type, case_id = case_id
-    )
-    print(f"連結案件{case_id}節點到案件類型節點：{case_type}")
+# 逐節點的建立訊息以 DEBUG 輸出，執行時加上 --verbose 才會顯示
+logger = logging.getLogger(__name__)
 
-# 建立或合併 模擬輸入 節點
-def merge_sim_input(tx, sim_input, case_id):
-    tx.run("MERGE (in:模擬輸入 {text: $sim_input,case_id: $case_id})", sim_input=sim_input, case_id = case_id)
-    print(f"建立或合併模擬輸入節點：{case_id}")
+# 連接到 Neo4j 資料庫，請確保 .env 中定義了 NEO4J_URI_3068, NEO4J_USERNAME, NEO4J_PASSWORD_3068；
+# driver 在執行建圖時才建立
+NEO4J_DATASET = "3068"
 
-# 建立或合併 模擬輸出 節點
-def merge_sim_output(tx, sim_output, case_id):
-    tx.run("MERGE (out:模擬輸出 {text: $sim_output,case_id: $case_id})", sim_output=sim_output, case_id = case_id)
-    print(f"建立或合併模擬輸出節點：{case_id}")
+# 批次寫入時每個交易包含的案件數
+BATCH_SIZE = 100
 
-# 將 模擬輸入 節點連結到 案件 節點
-def link_sim_input_to_case(tx, sim_input, case_id):
-    tx.run(
-        "MATCH (c:案件 {case_id: $case_id}), "
-        "(in:模擬輸入 {text: $sim_input,case_id: $case_id}) "
-        "MERGE (in)-[:屬於]->(c)",
-        sim_input=sim_input, case_id = case_id
-    )
-    print("連結模擬輸入節點到案件節點")
+# 建圖時一併產生嵌入向量的 batch 大小
+EMBED_BATCH_SIZE = 64
+
+# 同時送往 Ollama 的分類請求數（Ollama 端需設定 OLLAMA_NUM_PARALLEL 才會真正並行）
+CLASSIFY_WORKERS = int(os.getenv("CLASSIFY_WORKERS", "4"))
 
-# 將 模擬輸出 節點連結到 案件 節點
-def link_sim_output_to_case(tx, sim_output, case_id):
+# 每個案件各只有一個的節點標籤，皆以 case_id 作為唯一鍵
+CASE_LABELS = ["案件", "模擬輸入", "模擬輸出", "事故發生緣由", "受傷情形", "賠償根據", "案件屬性", "事實", "法條", "賠償"]
+
+# 建立唯一性約束（同時會建立 range index），讓以 case_id 查詢節點時不必掃描整個標籤
+def create_schema(session):
+    session.run("CREATE CONSTRAINT `案件類型_name` IF NOT EXISTS FOR (t:案件類型) REQUIRE t.name IS UNIQUE")
+    for label in CASE_LABELS:
+        session.run(
+            f"CREATE CONSTRAINT `{label}_case_id` IF NOT EXISTS "
+            f"FOR (n:`{label}`) REQUIRE n.case_id IS UNIQUE"
+        )
+    session.run("CALL db.awaitIndexes()")
+    logger.debug("建立唯一性約束與索引")
+
+# 解析模擬輸入與模擬輸出的各段落，案件類型與案件屬性留待分類階段填入
+def parse_case_row(case_id, sim_input, sim_output):
+    return {
+        "case_id": case_id,
+        "fingerprint": fingerprint_row(sim_input, sim_output),
+        "sim_input": sim_input,
+        "sim_output": sim_output,
+        "input_parts": parse_sim_input(sim_input, None)[:3],
+        "output_parts": parse_sim_output(sim_output),
+    }
+
+# 以 UNWIND 在同一個交易中寫入一整批案件
+def create_case_batch(tx, rows):
     tx.run(
-        "MATCH (c:案件 {case_id: $case_id}), "
-        "(out:模擬輸出 {text: $sim_output,case_id: $case_id}) "
-        "MERGE (out)-[:屬於]->(c)",
-        sim_output=sim_output, case_id = case_id
+        "UNWIND $rows AS row "
+        "MERGE (t:案件類型 {name: row.case_type}) "
+        "CREATE (c:案件 {case_id: row.case_id, fingerprint: row.fingerprint}) "
+        "MERGE (t)-[:所屬案件]->(c) "
+        "MERGE (in:模擬輸入 {case_id: row.case_id}) SET in.text = row.sim_input "
+        "MERGE (out:模擬輸出 {case_id: row.case_id}) SET out.text = row.sim_output "
+        "MERGE (in)-[:屬於]->(c) "
+        "MERGE (out)-[:屬於]->(c) "
+        "CREATE (c)-[:屬性]->(:案件屬性 {text: row.attribute, part_index: 4, case_id: row.case_id}) "
+        "CREATE (in)-[:包含]->(:事故發生緣由 {text: row.input_parts[0], part_index: 1, case_id: row.case_id, "
+        "embedding: row.embeddings[0], embedding_hash: row.embedding_hashes[0]}) "
+        "CREATE (in)-[:包含]->(:受傷情形 {text: row.input_parts[1], part_index: 2, case_id: row.case_id, "
+        "embedding: row.embeddings[1], embedding_hash: row.embedding_hashes[1]}) "
+        "CREATE (in)-[:包含]->(:賠償根據 {text: row.input_parts[2], part_index: 3, case_id: row.case_id, "
+        "embedding: row.embeddings[2], embedding_hash: row.embedding_hashes[2]}) "
+        "CREATE (out)-[:包含]->(:事實 {text: row.output_parts[0], part_index: 1, case_id: row.case_id}) "
+        "CREATE (out)-[:包含]->(:法條 {text: row.output_parts[1], part_index: 2, case_id: row.case_id}) "
+        "CREATE (out)-[:包含]->(:賠償 {text: row.output_parts[2], part_index: 3, case_id: row.case_id})",
+        rows=rows
     )
-    print("連結模擬輸出節點到案件節點")
-
-#將解析後的模擬輸入部分建立成子節點，並與原模擬輸入節點連結
-def create_sim_input_parts(tx, sim_input_value, parts_list, case_id):
-    # 依序建立每個子節點，並用「包含」關係連接到模擬輸入節點
-    for idx, part in enumerate(parts_list, start=1):
-        if idx == 1:
-            tx.run(
-                "CREATE (p:事故發生緣由 {text: $part, part_index: $idx, case_id: $case_id})",
-                part=part, idx=idx, case_id = case_id
-            )
-            print(f"建立模擬輸入事故發生緣由節點：=part_index={idx}")
-            tx.run(
-                "MATCH (m:模擬輸入 {text: $sim_input_value,case_id: $case_id}), (p:事故發生緣由 {text: $part, part_index: $idx,case_id: $case_id}) "
-                "MERGE (m)-[:包含]->(p)",
-                sim_input_value=sim_input_value, part=part, idx=idx, case_id = case_id
-            )   
-            print(f"連接模擬輸入節點 {case_id} 與子節點 part_index={idx}")
-        elif idx == 2:
-            tx.run(
-                "CREATE (p:受傷情形 {text: $part, part_index: $idx, case_id: $case_id})",
-                part=part, idx=idx, case_id = case_id
-            )
-            print(f"建立模擬輸入受傷情形節點：part_index={idx}")
-            tx.run(
-                "MATCH (m:模擬輸入 {text: $sim_input_value,case_id: $case_id}), (p:受傷情形 {text: $part, part_index: $idx,case_id: $case_id}) "
-                "MERGE (m)-[:包含]->(p)",
-                sim_input_value=sim_input_value, part=part, idx=idx, case_id = case_id
-            )   
-            print(f"連接模擬輸入節點 {case_id} 與子節點 part_index={idx}")
-        elif idx == 3:
-            tx.run(
-                "CREATE (p:賠償根據 {text: $part, part_index: $idx, case_id: $case_id})",
-                part=part, idx=idx, case_id = case_id
-            )
-            print(f"建立模擬輸入賠償根據節點：part_index={idx}")
-            tx.run(
-                "MATCH (m:模擬輸入 {text: $sim_input_value,case_id: $case_id}), (p:賠償根據 {text: $part, part_index: $idx,case_id: $case_id}) "
-                "MERGE (m)-[:包含]->(p)",
-                sim_input_value=sim_input_value, part=part, idx=idx, case_id = case_id
-            )   
-            print(f"連接模擬輸入節點 {sim_input_value} 與子節點 part_index={idx}")
-        elif idx == 4:
-            tx.run(
-                "CREATE (p:案件屬性 {text: $part, part_index: $idx, case_id: $case_id})",
-                part=part, idx=idx, case_id = case_id
-            )
-            print(f"建立案件屬性節點：value={part}, part_index={idx}")
-            tx.run(
-                "MATCH (m:案件 {case_id: $case_id}), (p:案件屬性 {text: $part, part_index: $idx,case_id: $case_id}) "
-                "MERGE (m)-[:屬性]->(p)",
-                part=part, idx=idx, case_id = case_id
-            )   
-            print(f"連接案件節點 {case_id} 與子節點part_index={idx}")
-
-def create_sim_output_parts(tx, sim_output_value, parts_list, case_id):
-    # 建立每個模擬輸出子節點並連接到原節點
-    for idx, part in enumerate(parts_list, start=1):
-        if idx == 1:
-            tx.run(
-                "CREATE (p:事實 {text: $part, part_index: $idx, case_id: $case_id})",
-                part=part, idx=idx, case_id = case_id
-            )
-            print(f"建立模擬輸出事實節點：part_index={idx}")
-            tx.run(
-                "MATCH (m:模擬輸出 {text: $sim_output_value, case_id: $case_id}), (p:事實 {text: $part, part_index: $idx, case_id: $case_id}) "
-                "MERGE (m)-[:包含]->(p)",
-                sim_output_value=sim_output_value, part=part, idx=idx, case_id = case_id
-            )
-            print(f"連接模擬輸出節點 {case_id} 與子節點part_index={idx}")
-        elif idx == 2:
-            tx.run(
-                "CREATE (p:法條 {text: $part, part_index: $idx, case_id: $case_id})",
-                part=part, idx=idx, case_id = case_id
-            )
-            print(f"建立模擬輸出子節點：part_index={idx}")
-            tx.run(
-                "MATCH (m:模擬輸出 {text: $sim_output_value, case_id: $case_id}), (p:法條 {text: $part, part_index: $idx, case_id: $case_id}) "
-                "MERGE (m)-[:包含]->(p)",
-                sim_output_value=sim_output_value, part=part, idx=idx, case_id = case_id
-            )
-            print(f"連接模擬輸出節點 {case_id} 與子節點 (part_index={idx}")
-        elif idx == 3:
-            tx.run(
-                "CREATE (p:賠償 {text: $part, part_index: $idx, case_id: $case_id})",
-                part=part, idx=idx, case_id = case_id
-            )
-            print(f"建立模擬輸出子節點：part_index={idx}")
-            tx.run(
-                "MATCH (m:模擬輸出 {text: $sim_output_value, case_id: $case_id}), (p:賠償 {text: $part, part_index: $idx, case_id: $case_id}) "
-                "MERGE (m)-[:包含]->(p)",
-                sim_output_value=sim_output_value, part=part, idx=idx, case_id = case_id
-            )
-            print(f"連接模擬輸出節點 {case_id} 與子節點 (part_index={idx}")
-
-# 函數：根據試算表中的資料建立節點與關係
-def create_case_data(tx, case_type, sim_input, sim_output, case_id, filtered_input):
-    merge_case_type(tx, case_type)
-    create_case_node(tx, case_id)
-    link_case_to_case_type(tx, case_type, case_id)
-    merge_sim_input(tx, sim_input, case_id)
-    merge_sim_output(tx, sim_output, case_id)
-    link_sim_input_to_case(tx, sim_input, case_id)
-    link_sim_output_to_case(tx, sim_output, case_id)
-    # 解析模擬輸入並建立子節點
-    input_parts = parse_sim_input(sim_input, filtered_input)
-    create_sim_input_parts(tx, sim_input, input_parts, case_id)
-    output_parts = parse_sim_output(sim_output)
-    create_sim_output_parts(tx, sim_output, output_parts, case_id)
+    logger.debug(f"批次寫入 {len(rows)} 筆案件，ID:{rows[0]['case_id']}~{rows[-1]['case_id']}")
 
 def delete_all_nodes(tx):
     tx.run("MATCH (n) DETACH DELETE n")
-    print("Delete All Node")
+    logger.debug("Delete All Node")
+
+# 以模擬輸入與模擬輸出的內容計算每筆資料的指紋，用來判斷案件是否需要重建
+def fingerprint_row(sim_input, sim_output):
+    digest = hashlib.sha256()
+    digest.update(str(sim_input).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(str(sim_output).encode("utf-8"))
+    return digest.hexdigest()
+
+# 讀取資料庫中現有案件的指紋 {case_id: fingerprint}
+def fetch_case_fingerprints(tx):
+    result = tx.run("MATCH (c:案件) RETURN c.case_id AS case_id, c.fingerprint AS fingerprint")
+    return {record["case_id"]: record["fingerprint"] for record in result}
+
+# 刪除指定案件的所有節點，並清掉已沒有案件的案件類型
+def delete_cases(tx, case_ids):
+    for label in CASE_LABELS:
+        tx.run(f"MATCH (n:`{label}`) WHERE n.case_id IN $case_ids DETACH DELETE n", case_ids=case_ids)
+    tx.run("MATCH (t:案件類型) WHERE NOT (t)-[:所屬案件]->() DELETE t")
+    logger.debug(f"刪除案件節點，ID:{case_ids}")
+
+def classify_rows(rows, classify=classify_case, max_workers=CLASSIFY_WORKERS):
+    """
+    以固定數量的執行緒並行分類案件，並依輸入順序產出結果。
+
+    同時進行中的分類最多為 max_workers 的兩倍，避免大量資料一次全部排入佇列。
+
+    Args:
+        rows: 可迭代的案件資料（parse_case_row 的輸出）。
+        classify: 分類函式，輸入模擬輸入並回傳 classify_case 格式的結果，測試時可替換成假的 LLM。
+        max_workers (int): 並行的分類數量。
+
+    Yields:
+        填入 case_type 與 attribute 的案件資料。
+    """
+    def finish(row, future):
+        info = future.result()
+        row["case_type"] = case_type_from_info(info)
+        row["attribute"] = format_case_info(info)
+        return row
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for row in rows:
+            pending.append((row, executor.submit(classify, row["sim_input"])))
+            if len(pending) >= max_workers * 2:
+                yield finish(*pending.popleft())
+        while pending:
+            yield finish(*pending.popleft())
+
+def embed_rows(rows, encode, hash_text, batch_size=EMBED_BATCH_SIZE, metrics=None):
+    """
+    將模擬輸入的三個部分（事故發生緣由、受傷情形、賠償根據）分批轉成嵌入向量，
+    寫入圖譜時一併存入節點，之後不必再跑一次嵌入。
+
+    Args:
+        rows: 可迭代的案件資料。
+        encode: 輸入文本列表、回傳向量列表的函式。
+        hash_text: 計算 embedding_hash 的函式，需與 KG_Embedding_B 相同。
+        batch_size (int): 每次編碼的文本數。
+        metrics (StageMetrics): 記錄每批編碼耗時。
+
+    Yields:
+        填入 embeddings 與 embedding_hashes（依部分順序，空文本為 None）的案件資料。
+    """
+    metrics = metrics or StageMetrics()
+
+    def flush(batch):
+        # 整批案件的所有部分一次編碼，空文本不產生向量（與 KG_Embedding_B 相同）
+        slots = [(row, i, text) for row in batch for i, text in enumerate(row["input_parts"][:3]) if text]
+        with metrics.timer("embed", len(batch)):
+            embeddings = encode([text for _, _, text in slots]) if slots else []
+        for row in batch:
+            row["embeddings"] = [None, None, None]
+            row["embedding_hashes"] = [None, None, None]
+        for (row, i, text), embedding in zip(slots, embeddings):
+            row["embeddings"][i] = embedding
+            row["embedding_hashes"][i] = hash_text(text)
+        return batch
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield from flush(batch)
+            batch = []
+    if batch:
+        yield from flush(batch)
+
+def build_graph(session, rows, incremental=False, batch_size=BATCH_SIZE,
+                classify=classify_case, max_workers=CLASSIFY_WORKERS, embed=None, metrics=None):
+    """
+    依試算表內容建立知識圖譜。
+
+    讀取、解析、分類、嵌入與寫入各自在不同的執行緒中進行，彼此以有界佇列連接，
+    因此資料量再大記憶體用量也不會增加，且 LLM 分類進行時其他 I/O 階段可以同時執行。
+
+    完整重建時 case_id 為資料列的順序（從 1 開始）。增量模式下以內容指紋比對現有案件：
+    內容相同的資料列沿用原本的 case_id 且不重新處理（不論在試算表中的位置是否改變），
+    新增或內容有變動的資料列以接續最大 case_id 的新 ID 寫入，資料庫中沒有對應資料列的案件則刪除。
+
+    Args:
+        session: Neo4j session。
+        rows: 可迭代的資料列，第一欄為模擬輸入、第二欄為模擬輸出。
+        incremental (bool): 是否只處理有變動的資料列。
+        batch_size (int): 每個交易寫入的案件數。
+        classify: 案件分類函式，每筆資料只會呼叫一次。
+        max_workers (int): 並行的分類數量。
+        embed: (encode, hash_text)，提供時會在寫入前先產生事故發生緣由的嵌入向量。
+        metrics (StageMetrics): 記錄各階段耗時，未指定時會自行建立。
+
+    Returns:
+        StageMetrics: 各階段的耗時統計。
+    """
+    metrics = metrics or StageMetrics()
+    with metrics.timer("cypher.schema"):
+        create_schema(session)
+    if incremental:
+        with metrics.timer("cypher.read_fingerprints"):
+            existing = session.execute_read(fetch_case_fingerprints)
+    else:
+        with metrics.timer("cypher.delete_all"):
+            session.execute_write(delete_all_nodes)
+        existing = {}
+
+    # 依指紋找出可以沿用的案件；內容重複的資料列各自對應一個案件
+    ids_by_fingerprint = {}
+    for case_id in sorted(existing):
+        ids_by_fingerprint.setdefault(existing[case_id], deque()).append(case_id)
+    next_id = max(existing, default=0) + 1
+    seen = set()
+    skipped = 0
+
+    # 篩選出需要重新處理的資料列，並為新內容分配 case_id
+    def pending_rows():
+        nonlocal skipped, next_id
+        for row in rows:
+            sim_input = row[0]
+            sim_output = row[1]
+            matches = ids_by_fingerprint.get(fingerprint_row(sim_input, sim_output))
+            if matches:
+                seen.add(matches.popleft())
+                skipped += 1
+                continue
+            yield next_id, sim_input, sim_output
+            next_id += 1
+
+    parse = metrics.wrap("parse", parse_case_row)
+    stages = [
+        lambda items: (parse(*item) for item in items),
+        lambda items: classify_rows(items, metrics.wrap("classify", classify), max_workers),
+    ]
+    if embed:
+        stages.append(lambda items: embed_rows(items, *embed, metrics=metrics))
+
+    def write(batch):
+        with metrics.timer("cypher.write_batch", len(batch)):
+            session.execute_write(create_case_batch, batch)
+
+    batch = []
+    for row in run_pipeline(pending_rows(), stages):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            write(batch)
+            batch = []
+    if batch:
+        write(batch)
+
+    removed_ids = sorted(set(existing) - seen)
+    if removed_ids:
+        with metrics.timer("cypher.delete_cases", len(removed_ids)):
+            session.execute_write(delete_cases, removed_ids)
+    logger.info(f"略過未變動案件 {skipped} 筆，刪除已移除案件 {len(removed_ids)} 筆")
+    return metrics
 
 def parse_sim_input(sim_input, filtered_input):
     match = re.search(r'一、(.*?)二、(.*?)三、(.*)', sim_input, re.S)
@@ -190,25 +270,29 @@ def parse_sim_output(sim_output):
     parsed_input=[match.group(1).strip(),match.group(2).strip(),comp_match]
     return parsed_input
 
-start_time = time.time()  # 記錄開始時間
 if __name__ == "__main__":
-    # 載入 Excel 檔案，假設檔案中有欄位名稱：案件類型、模擬輸入、模擬輸出
-    df = pd.read_excel("data.xlsx")  # 請將 your_file.xlsx 換成你的檔案名稱
-    # 使用 Neo4j session 逐筆將資料寫入資料庫
-    with driver.session() as session:
-        session.execute_write(delete_all_nodes)
-        case_id = 1
-        for index, row in df.iterrows():
-            sim_input = row.iloc[0]
-            sim_output = row.iloc[1]
-            filtered_input = generate_filter(sim_input)
-            case_type = get_case_type(filtered_input)
-            session.execute_write(create_case_data, case_type, sim_input, sim_output, case_id, filtered_input)
-            case_id += 1
-            
-    driver.close()
+    parser = argparse.ArgumentParser(description="由試算表建立車禍案件知識圖譜")
+    parser.add_argument("--input", default="data.xlsx", help="第一欄為模擬輸入、第二欄為模擬輸出的 Excel 檔")
+    parser.add_argument("--incremental", action="store_true", help="不清空資料庫，依內容比對只寫入新增或有變動的案件並刪除已移除的案件")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="每個交易寫入的案件數")
+    parser.add_argument("--workers", type=int, default=CLASSIFY_WORKERS, help="並行的 LLM 分類數量")
+    parser.add_argument("--embed", action="store_true", help="建圖時一併產生事故發生緣由、受傷情形與賠償根據的嵌入向量")
+    parser.add_argument("--metrics-out", help="將各階段耗時統計以 JSON 寫入此檔案")
+    parser.add_argument("--verbose", action="store_true", help="輸出每個節點的建立訊息")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="%(message)s")
+
+    embed = None
+    if args.embed:
+        from KG_Embedding_B import encode_texts, embedding_hash
+        embed = (encode_texts, embedding_hash)
+
+    # 逐列串流讀取試算表，累積 batch_size 筆案件後再以單一交易批次寫入資料庫
+    with get_driver(NEO4J_DATASET).session() as session:
+        metrics = build_graph(session, iter_excel_rows(args.input), incremental=args.incremental,
+                              batch_size=args.batch_size, max_workers=args.workers, embed=embed)
+
+    close_all()
     #add_embeddings_to_nodes()
 
-end_time = time.time()  # 記錄結束時間
-execution_time = end_time - start_time  # 計算執行時間
-print(f"執行時間: {execution_time}")
\ No newline at end of file
+    print(metrics.to_json(args.metrics_out))
@@ -1,37 +1,81 @@
-from neo4j import GraphDatabase
-from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
-import os
-# 連接到 Neo4j
+import hashlib
+from resources import MODEL_NAME, get_driver, get_encoder
+from vector_codec import EMBEDDING_FORMAT, encode_embedding
 # 加載 .env 文件中的環境變數
 load_dotenv()
 
-# 使用環境變數
-uri = os.getenv("NEO4J_URI_3068")
-username = os.getenv("NEO4J_USERNAME")
-password = os.getenv("NEO4J_PASSWORD_3068")
-driver = GraphDatabase.driver(uri, auth=(username, password))
+# 寫入嵌入的 Neo4j 資料集；driver 與嵌入模型都在第一次使用時才建立
+NEO4J_DATASET = "3068"
 
-# 加載嵌入模型
-model = SentenceTransformer('shibing624/text2vec-base-chinese')
+# 檢索時實際會用到向量的節點標籤（需與 index_store.EMBED_FIELDS 相同）
+EMBED_LABELS = ["事故發生緣由", "受傷情形", "賠償根據"]
+# 每次從 Neo4j 讀取並寫回的節點數
+PAGE_SIZE = 512
+# SentenceTransformer.encode 每個 batch 的文本數
+ENCODE_BATCH_SIZE = 64
+
+# 文本、模型與儲存格式的雜湊，用來判斷節點的向量是否已是最新；
+# 改用 EMBEDDING_FORMAT=fp16/sq8 後重新執行本程式即會把既有節點轉成新格式
+def embedding_hash(text):
+    key = f"{MODEL_NAME}\0{text}" if EMBEDDING_FORMAT == "list" else f"{MODEL_NAME}\0{EMBEDDING_FORMAT}\0{text}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+# 以 CPU 批次產生嵌入向量，並轉成 EMBEDDING_FORMAT 指定的節點屬性格式
+def encode_texts(texts, batch_size=ENCODE_BATCH_SIZE):
+    embeddings = get_encoder(MODEL_NAME).encode(texts, batch_size=batch_size, device="cpu", show_progress_bar=False)
+    return [encode_embedding(embedding) for embedding in embeddings]
+
+# 依 case_id 分頁讀取節點
+def fetch_page(tx, label, after, limit):
+    result = tx.run(
+        f"MATCH (n:`{label}`) WHERE n.case_id > $after "
+        "RETURN n.case_id AS case_id, n.text AS text, n.embedding_hash AS embedding_hash "
+        "ORDER BY n.case_id LIMIT $limit",
+        after=after, limit=limit
+    )
+    return [record.data() for record in result]
+
+# 以 UNWIND 一次寫回整頁的向量
+def write_embeddings(tx, label, rows):
+    tx.run(
+        "UNWIND $rows AS row "
+        f"MATCH (n:`{label}` {{case_id: row.case_id}}) "
+        "SET n.embedding = row.embedding, n.embedding_hash = row.embedding_hash",
+        rows=rows
+    )
 
 # 提取節點文本並生成嵌入向量
-def add_embeddings_to_nodes():
-    with driver.session() as session:
-        # 提取所有需要嵌入的節點
-        nodes = session.run("MATCH (n) RETURN elementId(n) AS id, n.text AS text")
-        
-        for record in nodes:
-            node_id = record["id"]
-            text = record["text"]
-            if text:  # 確保文本不為空
-                # 生成嵌入向量
-                embedding = model.encode(text).tolist()
-                # 更新節點，將嵌入向量存為屬性
-                session.run(
-                    "MATCH (n) WHERE elementId(n) = $id SET n.embedding = $embedding",
-                    id=node_id, embedding=embedding
-                )
+def add_embeddings_to_nodes(labels=EMBED_LABELS, page_size=PAGE_SIZE, batch_size=ENCODE_BATCH_SIZE):
+    with get_driver(NEO4J_DATASET).session() as session:
+        for label in labels:
+            after = 0
+            embedded = 0
+            while True:
+                page = session.execute_read(fetch_page, label, after, page_size)
+                if not page:
+                    break
+                after = page[-1]["case_id"]
+                # 略過空文本與向量已是最新的節點
+                pending = [
+                    record for record in page
+                    if record["text"] and record["embedding_hash"] != embedding_hash(record["text"])
+                ]
+                if not pending:
+                    continue
+                embeddings = encode_texts([record["text"] for record in pending], batch_size)
+                rows = [
+                    {
+                        "case_id": record["case_id"],
+                        "embedding": embedding,
+                        "embedding_hash": embedding_hash(record["text"]),
+                    }
+                    for record, embedding in zip(pending, embeddings)
+                ]
+                session.execute_write(write_embeddings, label, rows)
+                embedded += len(rows)
+            print(f"{label} 節點更新 {embedded} 筆嵌入向量")
 
 # 執行嵌入添加
-add_embeddings_to_nodes()
\ No newline at end of file
+if __name__ == "__main__":
+    add_embeddings_to_nodes()
@@ -3,8 +3,12 @@ from langchain.prompts import PromptTemplate
 from langchain_ollama import OllamaLLM
 from define_case_type import get_case_type
 from KG_Faiss_Query_3068 import query_faiss
-from Neo4j_Query import get_statude_case
+from Neo4j_Query import get_cases
+import asyncio
+import os
+import queue
 import re
+import threading
 import time
 s="""
 一、事故發生緣由:
@@ -92,7 +96,15 @@ comp_promt=PromptTemplate(
 備註:請盡量不要使用#字號
 """
 )
-llm = OllamaLLM(model="kenneth85/llama-3-taiwan:8b-instruct-dpo-q8_0",temperature=0.1,keep_alive=0)
+def default_llm():
+    return OllamaLLM(model="kenneth85/llama-3-taiwan:8b-instruct-dpo-q8_0",temperature=0.1,keep_alive=0)
+
+# 同步的 generate_* 共用這個 LLM；OllamaLLM 的非同步客戶端會綁定第一次使用時的事件迴圈，
+# 因此非同步的生成每次都在自己的事件迴圈中以 default_llm() 另外建立
+llm = default_llm()
+# 同時送往 Ollama 的段落生成數（Ollama 端需設定 OLLAMA_NUM_PARALLEL 才會真正並行）
+GENERATE_CONCURRENCY = int(os.getenv("GENERATE_CONCURRENCY", "3"))
+
 def generate_fact(input_data):
     # 創建 LLMChain
     llm_chain = LLMChain(llm=llm, prompt=fact_template)
@@ -102,19 +114,16 @@ def generate_fact(input_data):
     })
     return lawsuit_draft
 
+def find_legal_references(input_data, case_type, top_k=1):
+    # 查詢最相似的案件，並一次取得這些案件的法條資訊
+    closest_cases = query_faiss(input_data, case_type, top_k)
+    ids=[i['id'] for i in closest_cases]
+    return [case["statute"] for case in get_cases(ids) if case["statute"]]
+
 def generate_legal(input_data, case_type):
      # 創建 LLMChain
     llm_chain = LLMChain(llm=llm, prompt=legal_template)
-    # 查詢最相似的案件
-    closest_cases = query_faiss(input_data, case_type,1)
-    ids=[i['id'] for i in closest_cases]
-    legal_references = []
-    for i in ids:
-        # 查詢法條資訊
-        legal_reference = get_statude_case(i)
-        if legal_reference:
-            legal_references.append(legal_reference)
-    # 提取最相似案件的法條資訊
+    legal_references = find_legal_references(input_data, case_type)
     # 傳入數據生成起訴書
     lawsuit_draft = llm_chain.run({
         "case_facts": input_data,
@@ -141,22 +150,229 @@ def split_input(user_input):
     }
     return input_dict
 
-def generate_lawsuit(user_input):
-    start_time = time.time()  # 記錄開始時間
+async def agenerate_lawsuit(user_input, concurrency=GENERATE_CONCURRENCY, llm=None):
+    """
+    以非同步方式生成起訴狀：事實與賠償段落不需要案件類型，一開始就送出；
+    案件類型判斷完成後立即檢索相似案件的法條，再生成法條段落。
+    三個段落最多同時 concurrency 個送往 Ollama，總時間接近最慢的一條路徑而非各段相加。
+
+    Args:
+        user_input (str): 含一、二、三段的案件描述。
+        concurrency (int): 同時進行的段落生成數上限。
+        llm: 要使用的 LLM，必須在目前的事件迴圈中建立；預設新建 default_llm()，測試時可傳入假的 LLM。
+
+    Returns:
+        Tuple[str, Dict[str, float]]: 起訴狀內容，以及各步驟的耗時（秒）：
+        case_type、retrieval、fact、legal、comp（不含排隊等待的時間）與 total。
+    """
+    start_time = time.perf_counter()
+    if llm is None:
+        llm = default_llm()
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = {}
     input_dict = split_input(user_input)
-    case_type=get_case_type(user_input)
-    case_facts = input_dict["case_facts"]
-    fact=generate_fact(case_facts)
-    #print(fact)
-    #print()
-    legal=generate_legal(input_dict["case_facts"], case_type)
-    #print(legal)
-    #print()
-    comp=generate_comp(user_input)
-    end_time = time.time()  # 記錄結束時間
-    execution_time = end_time - start_time  # 計算執行時間
-    print(f"執行時間: {execution_time} seconds")
-    return fact+"\n\n"+legal+"\n\n"+comp
+
+    async def generate(name, prompt, inputs):
+        async with semaphore:
+            start = time.perf_counter()
+            result = await LLMChain(llm=llm, prompt=prompt).arun(inputs)
+            timings[name] = time.perf_counter() - start
+            return result
+
+    async def run_blocking(name, func, *args):
+        # 案件類型判斷與檢索是同步的呼叫，放到執行緒中以免阻塞其他段落
+        start = time.perf_counter()
+        result = await asyncio.to_thread(func, *args)
+        timings[name] = time.perf_counter() - start
+        return result
+
+    fact_task = asyncio.create_task(generate("fact", fact_template, {"case_facts": input_dict["case_facts"]}))
+    comp_task = asyncio.create_task(generate("comp", comp_promt, {
+        "injury_details": input_dict["injury_details"],
+        "compensation_request": input_dict["compensation_request"],
+    }))
+    try:
+        case_type = await run_blocking("case_type", get_case_type, user_input)
+        legal_references = await run_blocking("retrieval", find_legal_references, input_dict["case_facts"], case_type)
+        legal = await generate("legal", legal_template, {
+            "case_facts": input_dict["case_facts"],
+            "legal_references": legal_references,
+        })
+        fact, comp = await asyncio.gather(fact_task, comp_task)
+    except BaseException:
+        fact_task.cancel()
+        comp_task.cancel()
+        raise
+    timings["total"] = time.perf_counter() - start_time
+    return fact+"\n\n"+legal+"\n\n"+comp, timings
+
+def generate_lawsuit(user_input):
+    lawsuit, timings = asyncio.run(agenerate_lawsuit(user_input))
+    print("執行時間: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
+    return lawsuit
+
+# 串流輸出時段落的順序與標題
+SECTION_ORDER = ("fact", "legal", "comp")
+SECTION_TITLES = {"fact": "事實概述", "legal": "法條依據", "comp": "損害賠償"}
+_DONE = object()
+
+class LawsuitStream:
+    """
+    逐段串流生成起訴狀，可用 async for 或一般 for 迭代。
+
+    三個段落與 agenerate_lawsuit 一樣同時生成，但依 SECTION_ORDER 依序輸出：
+    正在輸出的段落即時送出 token，後面段落已生成的內容先暫存，輪到時立即送出。
+    每個事件為 dict：
+        {"event": "section", "section": 名稱, "title": 標題}  段落開始
+        {"event": "token", "section": 名稱, "text": 片段}      模型輸出的片段
+        {"event": "done", "document": 全文, "stats": 統計}     全部完成
+    迭代結束後也可由 document 與 stats 取得全文（與 generate_lawsuit 相同）與統計。
+
+    stats 中每個段落記錄 ttft_s（送出請求到第一個片段）、tokens（Ollama 串流的片段數，約等於 token 數）、
+    tokens_per_s（第一個片段之後的生成速度）與 total_s；另有 case_type、retrieval 的耗時，
+    first_output_s（開始到送出第一個片段）與 total_s。
+    """
+
+    def __init__(self, user_input, concurrency=GENERATE_CONCURRENCY, llm=None):
+        self.user_input = user_input
+        self.concurrency = concurrency
+        # 未指定時在串流自己的事件迴圈中新建 default_llm()，不與其他迴圈共用非同步客戶端
+        self.llm = llm
+        self.document = None
+        self.stats = {}
+
+    def __aiter__(self):
+        return self._events()
+
+    def __iter__(self):
+        # 在背景執行緒中跑事件迴圈，讓同步程式也能逐段取得輸出
+        events = queue.Queue()
+        started = threading.Event()
+        running = {}
+
+        async def pump():
+            running["loop"] = asyncio.get_running_loop()
+            running["task"] = asyncio.current_task()
+            started.set()
+            stream = self._events()
+            try:
+                async for event in stream:
+                    events.put(event)
+            finally:
+                await stream.aclose()
+
+        def run():
+            try:
+                asyncio.run(pump())
+            except asyncio.CancelledError:
+                pass
+            except BaseException as e:
+                events.put(e)
+            finally:
+                started.set()
+                events.put(_DONE)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        started.wait()
+        try:
+            while True:
+                event = events.get()
+                if event is _DONE:
+                    return
+                if isinstance(event, BaseException):
+                    raise event
+                yield event
+        finally:
+            # 呼叫端提早停止迭代時取消背景的生成，不讓其餘段落繼續送往 Ollama
+            if thread.is_alive() and "task" in running:
+                try:
+                    running["loop"].call_soon_threadsafe(running["task"].cancel)
+                except RuntimeError:
+                    # 事件迴圈已經結束
+                    pass
+
+    async def _events(self):
+        start_time = time.perf_counter()
+        llm = self.llm if self.llm is not None else default_llm()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        input_dict = split_input(self.user_input)
+        outputs = {name: asyncio.Queue() for name in SECTION_ORDER}
+        parts = {name: [] for name in SECTION_ORDER}
+
+        async def produce(name, prompt, inputs):
+            async with semaphore:
+                start = time.perf_counter()
+                first = None
+                tokens = 0
+                async for chunk in (prompt | llm).astream(inputs):
+                    if first is None:
+                        first = time.perf_counter()
+                    tokens += 1
+                    await outputs[name].put(chunk)
+                end = time.perf_counter()
+            self.stats[name] = {
+                "ttft_s": (first or end) - start,
+                "tokens": tokens,
+                "tokens_per_s": tokens / (end - first) if first is not None and end > first else None,
+                "total_s": end - start,
+            }
+
+        async def run_section(name, make_inputs):
+            # 錯誤也放進該段落的佇列，由輸出端拋出
+            try:
+                await produce(name, *await make_inputs())
+            except Exception as e:
+                await outputs[name].put(e)
+            await outputs[name].put(_DONE)
+
+        async def fact_inputs():
+            return fact_template, {"case_facts": input_dict["case_facts"]}
+
+        async def comp_inputs():
+            return comp_promt, {
+                "injury_details": input_dict["injury_details"],
+                "compensation_request": input_dict["compensation_request"],
+            }
+
+        async def legal_inputs():
+            start = time.perf_counter()
+            case_type = await asyncio.to_thread(get_case_type, self.user_input)
+            self.stats["case_type"] = time.perf_counter() - start
+            start = time.perf_counter()
+            legal_references = await asyncio.to_thread(find_legal_references, input_dict["case_facts"], case_type)
+            self.stats["retrieval"] = time.perf_counter() - start
+            return legal_template, {"case_facts": input_dict["case_facts"], "legal_references": legal_references}
+
+        tasks = [
+            asyncio.create_task(run_section("fact", fact_inputs)),
+            asyncio.create_task(run_section("legal", legal_inputs)),
+            asyncio.create_task(run_section("comp", comp_inputs)),
+        ]
+        try:
+            for name in SECTION_ORDER:
+                yield {"event": "section", "section": name, "title": SECTION_TITLES[name]}
+                while True:
+                    item = await outputs[name].get()
+                    if item is _DONE:
+                        break
+                    if isinstance(item, BaseException):
+                        raise item
+                    if "first_output_s" not in self.stats:
+                        self.stats["first_output_s"] = time.perf_counter() - start_time
+                    parts[name].append(item)
+                    yield {"event": "token", "section": name, "text": item}
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        self.document = "\n\n".join("".join(parts[name]) for name in SECTION_ORDER)
+        self.stats["total_s"] = time.perf_counter() - start_time
+        yield {"event": "done", "document": self.document, "stats": self.stats}
+
+def stream_lawsuit(user_input, concurrency=GENERATE_CONCURRENCY, llm=None):
+    """回傳逐段輸出起訴狀的 LawsuitStream，例如：for event in stream_lawsuit(text): ..."""
+    return LawsuitStream(user_input, concurrency, llm)
 
 #start_time = time.time()  # 記錄開始時間
 #l=generate_lawsuit(s)
@@ -1,24 +1,17 @@
 from KG_Generate import generate_lawsuit
-from googleapiclient.discovery import build
-from google.oauth2.service_account import Credentials
+from resources import get_sheets
 import os
 from dotenv import load_dotenv
 load_dotenv()
-# Google Sheets API 配置
-SERVICE_ACCOUNT_FILE = os.getenv("PATH_TO_GOOGLE_JSON")
-SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+# Google Sheets 客戶端由 resources.get_sheets 在第一次使用時建立
 # 試算表 ID 和範圍
 SPREADSHEET_ID = os.getenv("SPREADSHEET_ID")
 RANGE_READ = 'Sheet1!A:A'  # 讀取 A 欄
 RANGE_WRITE = 'Sheet1!B1'  # 從 B1 開始寫入
 
-# 初始化 Google Sheets 客戶端
-creds = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-service = build('sheets', 'v4', credentials=creds)
-sheet = service.spreadsheets()
-
 # 讀取試算表數據並逐條生成結果
 def read_and_write_sheets():
+    sheet = get_sheets()
     # 讀取 A 欄數據
     result = sheet.values().get(spreadsheetId=SPREADSHEET_ID, range=RANGE_READ).execute()
     values = result.get("values", [])
@@ -1,15 +1,15 @@
 from dotenv import load_dotenv
-from neo4j import GraphDatabase
-import os
 import re
+from doc_store import get_doc_store
+from resources import DATASETS, get_driver
+from vector_codec import decode_embedding
 # 加載 .env 配置
 load_dotenv()
 
-# Neo4j 配置
-uri = os.getenv("NEO4J_URI_3068")
-username = os.getenv("NEO4J_USERNAME")
-password = os.getenv("NEO4J_PASSWORD_3068")
-driver = GraphDatabase.driver(uri, auth=(username, password))
+# Neo4j 配置：與檢索共用同一個 driver 連線池，第一次查詢時才建立
+NEO4J_DATASET = "3068"
+# 案件文件先由此資料集目前索引版本中的本地文件庫讀取，找不到的才查詢 Neo4j
+DOC_STORE_ROOT = DATASETS[NEO4J_DATASET]
 
 def find_statute_by_case_id(tx, case_id):
     query = (
@@ -47,20 +47,72 @@ def find_simoutput_by_case_id(tx, case_id):
     else:
         return None
 
+# 單筆查詢也經過 get_cases，本地文件庫有資料時不需連線 Neo4j
 def get_statude_case(case_id):
-    with driver.session() as session:
-        statude = session.execute_read(find_statute_by_case_id, case_id)
-        return statude
-    
+    return get_cases([case_id])[0]["statute"]
+
 def get_siminput_case(case_id):
-    with driver.session() as session:
-        siminput = session.execute_read(find_siminput_by_case_id, case_id)
-        return siminput
-    
+    return get_cases([case_id])[0]["siminput"]
+
 def get_simoutput_case(case_id):
-    with driver.session() as session:
-        simoutput = session.execute_read(find_simoutput_by_case_id, case_id)
-        return simoutput
+    return get_cases([case_id])[0]["simoutput"]
+
+# 一次取得多個案件的模擬輸入、模擬輸出、法條與案件類型，結果依輸入順序排列
+def find_cases_by_ids(tx, case_ids):
+    query = (
+        "UNWIND range(0, size($case_ids) - 1) AS i "
+        "WITH i, $case_ids[i] AS case_id "
+        "OPTIONAL MATCH (t:案件類型)-[:所屬案件]->(:案件 {case_id: case_id}) "
+        "OPTIONAL MATCH (in:模擬輸入 {case_id: case_id}) "
+        "OPTIONAL MATCH (out:模擬輸出 {case_id: case_id}) "
+        "OPTIONAL MATCH (s:法條 {case_id: case_id}) "
+        "RETURN i, case_id, in.text AS siminput, out.text AS simoutput, s.text AS statute, t.name AS case_type"
+    )
+    cases = [
+        {"case_id": case_id, "siminput": None, "simoutput": None, "statute": None, "case_type": None}
+        for case_id in case_ids
+    ]
+    for record in tx.run(query, case_ids=list(case_ids)):
+        cases[record["i"]] = {key: record[key] for key in ("case_id", "siminput", "simoutput", "statute", "case_type")}
+    return cases
+
+# 取得所有案件的文件，用於在構建索引時寫入本地文件庫
+def find_all_cases(tx):
+    query = (
+        "MATCH (c:案件) "
+        "OPTIONAL MATCH (t:案件類型)-[:所屬案件]->(c) "
+        "OPTIONAL MATCH (in:模擬輸入 {case_id: c.case_id}) "
+        "OPTIONAL MATCH (out:模擬輸出 {case_id: c.case_id}) "
+        "OPTIONAL MATCH (s:法條 {case_id: c.case_id}) "
+        "RETURN c.case_id AS case_id, in.text AS siminput, out.text AS simoutput, s.text AS statute, "
+        "t.name AS case_type ORDER BY c.case_id"
+    )
+    return [record.data() for record in tx.run(query)]
+
+def get_cases(case_ids):
+    """
+    取得多個案件的資料，取代逐筆呼叫 get_siminput_case/get_simoutput_case/get_statude_case。
+
+    先讀取本地文件庫，只有文件庫中沒有的案件才以單一讀取交易查詢 Neo4j，
+    因此文件庫完整時 Neo4j 無法連線也能運作。
+
+    Args:
+        case_ids: 案件 ID 列表，可重複。
+
+    Returns:
+        List[dict]: 與輸入順序相同，每筆含 case_id、siminput、simoutput、statute、case_type；找不到的欄位為 None。
+    """
+    case_ids = [int(case_id) for case_id in case_ids]
+    if not case_ids:
+        return []
+    store = get_doc_store(DOC_STORE_ROOT)
+    cases = store.get_many(case_ids) if store is not None else {}
+    missing = [case_id for case_id in dict.fromkeys(case_ids) if case_id not in cases]
+    if missing:
+        with get_driver(NEO4J_DATASET).session() as session:
+            for case in session.execute_read(find_cases_by_ids, missing):
+                cases[case["case_id"]] = case
+    return [dict(cases[case_id]) for case_id in case_ids]
 
 # 函數：將法條格式標準化
 def normalize_statute_reference(reference):
@@ -92,6 +144,21 @@ def find_case_type_by_case_id(tx, case_id):
 
 
 def get_type_for_case(case_id):
-    with driver.session() as session:
-        case_type = session.execute_read(find_case_type_by_case_id, case_id)
-        return case_type
\ No newline at end of file
+    return get_cases([case_id])[0]["case_type"]
+
+# 取得某個欄位（事故發生緣由、受傷情形、賠償根據）節點的 ID、文本、嵌入與案件類型，可只取指定的案件類型
+def find_field_embeddings(tx, label, case_types=None):
+    query = (
+        "MATCH (t:案件類型)-[:所屬案件]->(c:案件) "
+        "WHERE $case_types IS NULL OR t.name IN $case_types "
+        f"MATCH (f:`{label}` {{case_id: c.case_id}}) "
+        "WHERE f.embedding IS NOT NULL "
+        "RETURN f.case_id AS id, f.text AS text, f.embedding AS embedding, t.name AS case_type"
+    )
+    result = tx.run(query, case_types=case_types)
+    # embedding 可能是浮點數列表或 fp16/sq8 位元組，一律還原成 float32 向量
+    return [{**record.data(), "embedding": decode_embedding(record["embedding"])} for record in result]
+
+# 取得事故發生緣由的 ID、文本、嵌入與案件類型，可只取指定的案件類型
+def find_reason_embeddings(tx, case_types=None):
+    return find_field_embeddings(tx, "事故發生緣由", case_types)
@@ -0,0 +1,279 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import faiss
+import numpy as np
+from build_index import load_records
+from build_metrics import percentile
+from index_factory import (CODECS, INDEX_KINDS, default_build_params, exact_search, holdout_split, make_index,
+                           recall_at_k, search_param_candidates, set_search_params)
+from index_store import (DEFAULT_FIELD, current_version, group_by_case_type, index_file, list_case_types,
+                         read_index_mmap, resolve_index_dir)
+from resources import DATASETS
+from vector_codec import EMBEDDING_FORMATS, decode_embedding, encode_embedding
+
+# 評估的 k 值，最大的 k 也是每次搜尋取回的數量
+RECALL_KS = (1, 5, 10)
+# 每個分片最多留出多少向量作為查詢
+MAX_QUERIES = 200
+
+def stored_vectors(index: faiss.Index) -> np.ndarray:
+    # 從已存的索引取回原始向量；Flat/HNSWFlat 可直接取回，IVF 需要先建立 direct map
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+def load_dataset_vectors(index_root: str) -> Dict[str, np.ndarray]:
+    """讀出索引目錄中每個案件類型的向量，完全離線。"""
+    index_dir = resolve_index_dir(index_root)
+    vectors = {}
+    for case_type in list_case_types(index_dir):
+        path = index_file(index_dir, case_type)
+        if not os.path.exists(path):
+            continue
+        # 需要一般讀取：mmap 開啟的 IVF 索引不能建立 direct map
+        index = faiss.read_index(path)
+        if index.ntotal:
+            vectors[case_type] = stored_vectors(index)
+    return vectors
+
+def split_queries(vectors: np.ndarray, max_queries: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """留出部分向量作為查詢，其餘作為索引資料，避免查詢本身就在索引中。"""
+    base_positions, query_positions = holdout_split(len(vectors), max_queries, seed)
+    return (np.ascontiguousarray(vectors[base_positions]),
+            np.ascontiguousarray(vectors[query_positions]))
+
+def measure(index: faiss.Index, queries: np.ndarray, truth: np.ndarray) -> Dict[str, Any]:
+    k = max(RECALL_KS)
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    _, found = index.search(queries, k)
+    batch_s = time.perf_counter() - start
+    result = {f"recall@{r}": round(recall_at_k(found, truth, r), 4) for r in RECALL_KS}
+    result.update({
+        "p50_ms": round(percentile(latencies, 50) * 1000, 4),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 4),
+        "batch_qps": round(len(queries) / batch_s, 1) if batch_s else None,
+    })
+    return result
+
+# 在獨立的子行程中量測載入索引前後的常駐記憶體（RSS），不受本行程累積的記憶體影響。
+# 以 mmap 開啟的索引只有被存取的頁面才會常駐，因此另外記錄執行一次查詢後的 RSS。
+# FAISS 的載入程式與 OpenMP 執行緒第一次使用時也會增加 RSS，且與索引大小無關，
+# 因此先載入並查詢一個相同類型與格式、只有一個向量的索引作為基準，只回報之後增加的部分
+_RSS_SCRIPT = """
+import json, os, resource, sys
+import faiss, numpy as np
+from index_store import read_index_mmap
+
+def rss_kb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except OSError:
+        # 沒有 /proc 時退回峰值 RSS（macOS 以位元組為單位）
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak // 1024 if sys.platform == "darwin" else peak
+
+queries = np.load(sys.argv[3])
+k = int(sys.argv[4])
+baseline = read_index_mmap(sys.argv[2])
+baseline.search(queries, k)
+before = rss_kb()
+index = read_index_mmap(sys.argv[1])
+loaded = rss_kb()
+index.search(queries, k)
+print(json.dumps({"rss_load_kb": max(0, loaded - before), "rss_search_kb": max(0, rss_kb() - before)}))
+"""
+
+def measure_rss(path: str, baseline_path: str, queries: np.ndarray, k: int) -> Dict[str, Any]:
+    """
+    回傳子行程中載入索引後與查詢後增加的 RSS（KB），已扣除載入並查詢 baseline_path（相同設定、只有一個向量的索引）的部分；
+    量測失敗時回傳空字典。數值以頁為單位，很小的索引仍可能顯示數 KB 的誤差。
+    """
+    queries_path = os.path.join(os.path.dirname(path), "queries.npy")
+    np.save(queries_path, queries)
+    try:
+        result = subprocess.run([sys.executable, "-c", _RSS_SCRIPT, path, baseline_path, queries_path, str(k)],
+                                capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        return json.loads(result.stdout.strip().splitlines()[-1])
+    except (OSError, subprocess.CalledProcessError, ValueError, IndexError):
+        return {}
+
+def load_stats(index: faiss.Index, queries: np.ndarray) -> Dict[str, Any]:
+    # 寫到暫存檔再以 mmap 讀回，記錄載入時間、檔案大小與子行程中實際常駐的記憶體
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "index.faiss")
+        faiss.write_index(index, path)
+        # 基準索引保留訓練結果（IVF 中心點、SQ 範圍）但只有一個向量，讓查詢真正執行一次（空索引會直接返回）
+        baseline = faiss.clone_index(index)
+        baseline.reset()
+        baseline.add(queries[:1])
+        baseline_path = os.path.join(tmp_dir, "baseline.faiss")
+        faiss.write_index(baseline, baseline_path)
+        start = time.perf_counter()
+        read_index_mmap(path)
+        load_ms = (time.perf_counter() - start) * 1000
+        return {"load_ms": round(load_ms, 3), "index_bytes": os.path.getsize(path),
+                **measure_rss(path, baseline_path, queries, max(RECALL_KS))}
+
+def benchmark_shard(vectors: np.ndarray, kinds: Tuple[str, ...], max_queries: int, seed: int,
+                    codecs: Tuple[str, ...] = ("fp32",)) -> Optional[Dict[str, Any]]:
+    """
+    在單一分片上比較各種索引設定與暴力搜尋的結果。
+
+    量化格式（fp16/sq8）的設定另外記錄 recall_loss@k，即與相同 kind、search 的 fp32 設定相比下降的 recall。
+
+    Returns:
+        Optional[Dict[str, Any]]: 分片大小、查詢數與每個設定（kind、codec、build、search）的指標；向量太少時回傳 None。
+    """
+    if len(vectors) < 2:
+        return None
+    base, queries = split_queries(vectors, max_queries, seed)
+    _, truth = exact_search(base, queries, max(RECALL_KS))
+    configs = []
+    for kind in kinds:
+        build_params = default_build_params(kind, *base.shape)
+        if build_params is None:
+            continue
+        # ivf_pq 本身就是量化儲存，不另外比較 codec
+        for codec in (("fp32",) if kind == "ivf_pq" else codecs):
+            start = time.perf_counter()
+            index = make_index(kind, base, build_params, codec)
+            build_s = time.perf_counter() - start
+            stats = load_stats(index, queries)
+            for search_params in search_param_candidates(kind, build_params):
+                set_search_params(index, search_params)
+                configs.append({"kind": kind, "codec": codec, "build": build_params, "search": search_params,
+                                "build_s": round(build_s, 4), **stats, **measure(index, queries, truth)})
+    add_recall_loss(configs)
+    return {"count": len(base), "queries": len(queries), "configs": configs}
+
+def add_recall_loss(configs: List[Dict[str, Any]]) -> None:
+    baseline = {json.dumps([c["kind"], c["search"]], sort_keys=True): c for c in configs if c["codec"] == "fp32"}
+    for config in configs:
+        reference = baseline.get(json.dumps([config["kind"], config["search"]], sort_keys=True))
+        if config["codec"] == "fp32" or reference is None:
+            continue
+        for r in RECALL_KS:
+            config[f"recall_loss@{r}"] = round(reference[f"recall@{r}"] - config[f"recall@{r}"], 4)
+
+def benchmark_graph_formats(vectors_by_type: Dict[str, np.ndarray], max_queries: int, seed: int) -> Dict[str, Any]:
+    """
+    比較 Neo4j 中各種嵌入格式每個向量的位元組數，以及以還原後的向量做暴力搜尋時的 recall。
+    """
+    results = {fmt: {"bytes_per_vector": 0, "queries": 0, "weighted": {}} for fmt in EMBEDDING_FORMATS}
+    for vectors in vectors_by_type.values():
+        vectors = np.asarray(vectors, dtype="float32")
+        if len(vectors) < 2:
+            continue
+        base, queries = split_queries(vectors, max_queries, seed)
+        _, truth = exact_search(base, queries, max(RECALL_KS))
+        for fmt, result in results.items():
+            encoded = [encode_embedding(vector, fmt) for vector in base]
+            # list 格式在 Neo4j 中以 64-bit double 儲存
+            result["bytes_per_vector"] = base.shape[1] * 8 if fmt == "list" else len(encoded[0])
+            decoded = np.vstack([decode_embedding(value) for value in encoded])
+            _, found = exact_search(decoded, queries, max(RECALL_KS))
+            result["queries"] += len(queries)
+            for r in RECALL_KS:
+                metric = f"recall@{r}"
+                result["weighted"][metric] = result["weighted"].get(metric, 0.0) + recall_at_k(found, truth, r) * len(queries)
+    for result in results.values():
+        weighted = result.pop("weighted")
+        if result["queries"]:
+            result.update({metric: round(value / result["queries"], 4) for metric, value in weighted.items()})
+    return results
+
+def summarize(shards: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # 依查詢數加權彙整各分片中相同設定的 recall，延遲取各分片 p50/p99 的加權平均
+    totals: Dict[str, Dict[str, Any]] = {}
+    for shard in shards.values():
+        for config in shard["configs"]:
+            key = json.dumps([config["kind"], config["codec"], config["search"]], sort_keys=True)
+            total = totals.setdefault(key, {"kind": config["kind"], "codec": config["codec"], "search": config["search"],
+                                            "shards": 0, "queries": 0, "index_bytes": 0, "rss_search_kb": 0,
+                                            "weighted": {}})
+            total["shards"] += 1
+            total["queries"] += shard["queries"]
+            total["index_bytes"] += config["index_bytes"]
+            # 所有分片同時載入並查詢過後的常駐記憶體
+            total["rss_search_kb"] += config.get("rss_search_kb", 0)
+            metrics = [f"recall@{r}" for r in RECALL_KS] + [f"recall_loss@{r}" for r in RECALL_KS] + ["p50_ms", "p99_ms"]
+            for metric in [metric for metric in metrics if metric in config]:
+                total["weighted"][metric] = total["weighted"].get(metric, 0.0) + config[metric] * shard["queries"]
+    summary = []
+    for total in totals.values():
+        weighted = total.pop("weighted")
+        total.update({metric: round(value / total["queries"], 4) for metric, value in weighted.items()})
+        summary.append(total)
+    return summary
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmark(vectors_by_type: Dict[str, np.ndarray], kinds: Tuple[str, ...] = INDEX_KINDS,
+                  max_queries: int = MAX_QUERIES, seed: int = 0, codecs: Tuple[str, ...] = ("fp32",)) -> Dict[str, Any]:
+    shards = {}
+    for case_type, vectors in sorted(vectors_by_type.items()):
+        result = benchmark_shard(np.asarray(vectors, dtype="float32"), kinds, max_queries, seed, codecs)
+        if result is not None:
+            shards[case_type] = result
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "faiss_version": faiss.__version__,
+        "recall_ks": list(RECALL_KS),
+        # 整個量測行程的峰值 RSS；每個設定的記憶體見 configs 中的 rss_load_kb、rss_search_kb
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "shards": shards,
+        "summary": summarize(shards),
+        "graph_formats": benchmark_graph_formats(vectors_by_type, max_queries, seed),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="離線比較各種 FAISS 索引設定的 recall 與延遲")
+    parser.add_argument("--dataset", choices=sorted(DATASETS), default="50", help="使用隨附索引目錄中的向量")
+    parser.add_argument("--index-root", help="索引根目錄，預設依資料集決定")
+    parser.add_argument("--from-file", help="改用 build_index.py --export 匯出的 .npz 嵌入檔")
+    parser.add_argument("--kinds", nargs="+", choices=INDEX_KINDS, default=list(INDEX_KINDS), help="要比較的索引類型")
+    parser.add_argument("--codecs", nargs="+", choices=CODECS, default=list(CODECS),
+                        help="要比較的索引向量格式，fp32 以外的格式會另外回報 recall 損失")
+    parser.add_argument("--max-queries", type=int, default=MAX_QUERIES, help="每個分片最多留出的查詢數")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="結果 JSON 的輸出路徑，預設印出")
+    args = parser.parse_args()
+
+    if args.from_file:
+        records = [record for record in load_records(args.from_file) if record["field"] == DEFAULT_FIELD]
+        vectors_by_type = {case_type: np.vstack(data["embeddings"])
+                           for case_type, data in group_by_case_type(records).items()}
+        source = args.from_file
+    else:
+        index_root = args.index_root or DATASETS[args.dataset]
+        vectors_by_type = load_dataset_vectors(index_root)
+        source = f"{index_root}@{current_version(index_root) or 'legacy'}"
+
+    report = {"source": source, **run_benchmark(vectors_by_type, tuple(args.kinds), args.max_queries, args.seed,
+                                                     tuple(args.codecs))}
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
@@ -0,0 +1,124 @@
+import argparse
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from dotenv import load_dotenv
+from Neo4j_Query import find_all_cases, find_field_embeddings
+from index_factory import CODECS, INDEX_KIND, INDEX_KINDS, TARGET_RECALL, VECTOR_CODEC
+from index_store import (DEFAULT_FIELD, DOC_FIELDS, EMBED_FIELDS, convert_legacy_dir, resolve_index_dir, verify_index_set,
+                         write_index_set)
+from resources import DATASETS, MODEL_NAME, get_driver
+
+# 加載 .env 配置
+load_dotenv()
+
+def fetch_records(dataset: str, fields: Sequence[str] = EMBED_FIELDS) -> List[Dict[str, Any]]:
+    # 每筆記錄另外帶有 field，標示來自哪個欄位
+    records = []
+    with get_driver(dataset).session() as session:
+        for field in fields:
+            records.extend({**record, "field": field} for record in session.execute_read(find_field_embeddings, field))
+    return records
+
+def fetch_documents(dataset: str) -> List[Dict[str, Any]]:
+    with get_driver(dataset).session() as session:
+        return session.execute_read(find_all_cases)
+
+def split_fields(records: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, List[Dict[str, Any]]]]:
+    """將記錄分成預設欄位與其餘欄位。"""
+    field_records: Dict[str, List[Dict[str, Any]]] = {}
+    for record in records:
+        field_records.setdefault(record.get("field", DEFAULT_FIELD), []).append(record)
+    return field_records.pop(DEFAULT_FIELD, []), field_records
+
+# 匯出檔為 .npz，包含 case_ids、case_types、texts、embeddings、fields 五個陣列，
+# 以及選用的案件文件 doc_<欄位>（文字欄位以空字串代表 None，避免需要 pickle）
+def export_records(records: List[Dict[str, Any]], path: str, documents: Optional[List[Dict[str, Any]]] = None) -> None:
+    documents = documents or []
+    np.savez(
+        path,
+        doc_case_ids=np.array([document["case_id"] for document in documents], dtype="int64"),
+        **{f"doc_{field}": np.array([document.get(field) or "" for document in documents], dtype=str)
+           for field in DOC_FIELDS[1:]},
+        fields=np.array([record.get("field", DEFAULT_FIELD) for record in records]),
+        case_ids=np.array([record["id"] for record in records]),
+        case_types=np.array([record["case_type"] for record in records]),
+        texts=np.array([record["text"] for record in records]),
+        embeddings=np.array([record["embedding"] for record in records], dtype="float32"),
+    )
+
+def load_records(path: str) -> List[Dict[str, Any]]:
+    with np.load(path) as data:
+        # 舊的匯出檔沒有 fields，全部視為預設欄位
+        fields = data["fields"].tolist() if "fields" in data.files else [DEFAULT_FIELD] * len(data["case_ids"])
+        return [
+            {"id": case_id, "case_type": case_type, "text": text, "embedding": embedding, "field": field}
+            for case_id, case_type, text, embedding, field in zip(
+                data["case_ids"].tolist(), data["case_types"].tolist(), data["texts"].tolist(), data["embeddings"],
+                fields
+            )
+        ]
+
+def load_documents(path: str) -> List[Dict[str, Any]]:
+    with np.load(path) as data:
+        if "doc_case_ids" not in data.files:
+            return []
+        columns = [data["doc_case_ids"].tolist()] + [data[f"doc_{field}"].tolist() for field in DOC_FIELDS[1:]]
+    return [
+        {field: (value if field == "case_id" else value or None) for field, value in zip(DOC_FIELDS, row)}
+        for row in zip(*columns)
+    ]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="離線構建一組完整的 FAISS 索引並切換為目前使用的版本")
+    parser.add_argument("--dataset", choices=sorted(DATASETS), default="3068", help="資料集名稱")
+    parser.add_argument("--index-root", help="索引根目錄，預設依資料集決定")
+    parser.add_argument("--from-file", help="從匯出的 .npz 嵌入檔構建，不需連線 Neo4j")
+    parser.add_argument("--export", help="只將 Neo4j 中的嵌入匯出成 .npz，不構建索引")
+    parser.add_argument("--fields", nargs="+", choices=EMBED_FIELDS, default=list(EMBED_FIELDS),
+                        help="要構建索引的欄位，事故發生緣由一定會包含")
+    parser.add_argument("--keep", type=int, default=3, help="保留的索引版本數")
+    parser.add_argument("--unified", action="store_true", help="另外構建包含所有案件類型的單一索引")
+    parser.add_argument("--index-kind", choices=("auto",) + INDEX_KINDS, default=INDEX_KIND,
+                        help="索引類型，auto 為每個分片自動挑選達到 recall 目標的最快索引")
+    parser.add_argument("--target-recall", type=float, default=TARGET_RECALL, help="自動挑選時的 recall@k 目標")
+    parser.add_argument("--codec", choices=CODECS, default=VECTOR_CODEC, help="索引中向量的儲存格式")
+    parser.add_argument("--verify", action="store_true", help="只檢查目前版本的檔案是否與 manifest 相符")
+    parser.add_argument("--convert-legacy", action="store_true", help="將索引目錄中舊版 pickle 格式的 metadata 轉成新格式")
+    args = parser.parse_args()
+    index_root = args.index_root or DATASETS[args.dataset]
+
+    if args.convert_legacy:
+        converted = convert_legacy_dir(resolve_index_dir(index_root))
+        print(f"已轉換 {len(converted)} 個案件類型的 metadata")
+        raise SystemExit(0)
+
+    if args.verify:
+        bad = verify_index_set(resolve_index_dir(index_root))
+        print("索引檔案完整" if not bad else f"索引檔案不符：{bad}")
+        raise SystemExit(1 if bad else 0)
+
+    if args.from_file:
+        records = [record for record in load_records(args.from_file) if record["field"] in args.fields]
+        documents = load_documents(args.from_file)
+        source = args.from_file
+    else:
+        records = fetch_records(args.dataset, list(dict.fromkeys([DEFAULT_FIELD] + args.fields)))
+        documents = fetch_documents(args.dataset)
+        source = f"neo4j:{args.dataset}"
+
+    if args.export:
+        export_records(records, args.export, documents)
+        print(f"已匯出 {len(records)} 筆嵌入與 {len(documents)} 筆案件文件到 {args.export}")
+    else:
+        reason_records, field_records = split_fields(records)
+        version, manifest = write_index_set(index_root, reason_records, MODEL_NAME, source, keep=args.keep,
+                                            unified=args.unified, index_kind=args.index_kind,
+                                            target_recall=args.target_recall, codec=args.codec,
+                                            field_records=field_records, documents=documents)
+        print(f"已構建索引版本 {version}：{len(manifest['shards'])} 個案件類型，共 {manifest['total_count']} 筆")
+        for case_type, shard in manifest["shards"].items():
+            print(f"  {case_type}：{shard['count']} 筆，{shard['index']['kind']}/{shard['index']['codec']} {shard['index']['search']}")
+        for field, info in manifest.get("fields", {}).items():
+            print(f"  欄位 {field}：{len(info['shards'])} 個案件類型，共 {info['total_count']} 筆")
+        if "documents" in manifest:
+            print(f"  案件文件庫：{manifest['documents']['count']} 筆")
@@ -0,0 +1,75 @@
+import json
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+def percentile(values: List[float], q: float) -> float:
+    # 取最近排名的百分位數，不需要 numpy
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+class StageMetrics:
+    """
+    記錄建圖各階段的耗時與處理筆數，可在多個執行緒中同時使用。
+
+    每次呼叫 timer()/record() 算一次操作，items 為該次操作處理的案件數（例如一個批次的大小）。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._durations: Dict[str, List[float]] = defaultdict(list)
+        self._items: Dict[str, int] = defaultdict(int)
+        self._started = time.perf_counter()
+
+    def record(self, stage: str, seconds: float, items: int = 1) -> None:
+        with self._lock:
+            self._durations[stage].append(seconds)
+            self._items[stage] += items
+
+    @contextmanager
+    def timer(self, stage: str, items: int = 1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, items)
+
+    def wrap(self, stage: str, func: Callable) -> Callable:
+        # 回傳會自動計時的函式
+        def timed(*args, **kwargs):
+            with self.timer(stage):
+                return func(*args, **kwargs)
+        return timed
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict[str, Any]: 總執行時間，以及每個階段的操作次數、筆數、總耗時、
+            每秒處理筆數（以該階段實際耗時計算）與 p50/p95 延遲（毫秒）。
+        """
+        with self._lock:
+            stages = {}
+            for stage, durations in self._durations.items():
+                total = sum(durations)
+                stages[stage] = {
+                    "calls": len(durations),
+                    "items": self._items[stage],
+                    "total_s": round(total, 4),
+                    "items_per_s": round(self._items[stage] / total, 2) if total else None,
+                    "p50_ms": round(percentile(durations, 50) * 1000, 2),
+                    "p95_ms": round(percentile(durations, 95) * 1000, 2),
+                }
+        return {"wall_time_s": round(time.perf_counter() - self._started, 4), "stages": stages}
+
+    def to_json(self, path: Optional[str] = None) -> str:
+        text = json.dumps(self.summary(), ensure_ascii=False, indent=2)
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+        return text
@@ -0,0 +1,86 @@
+import queue
+import threading
+from typing import Any, Callable, Iterable, Iterator, List, Tuple
+from openpyxl import load_workbook
+
+# 每個階段之間的佇列長度，限制同時存在於記憶體中的資料量
+QUEUE_SIZE = 64
+
+# 佇列結束標記
+_DONE = object()
+
+def iter_excel_rows(path: str, skip_header: bool = True) -> Iterator[Tuple[Any, ...]]:
+    """
+    以唯讀模式逐列讀取 Excel 檔，不會一次把整個工作表載入記憶體。
+
+    Args:
+        path (str): Excel 檔路徑。
+        skip_header (bool): 是否略過第一列的欄位名稱（與 pd.read_excel 的預設相同）。
+
+    Yields:
+        Tuple[Any, ...]: 每一列的儲存格內容，完全空白的列會被略過。
+    """
+    workbook = load_workbook(path, read_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        for row in sheet.iter_rows(min_row=2 if skip_header else 1, values_only=True):
+            if any(cell is not None for cell in row):
+                yield row
+    finally:
+        workbook.close()
+
+def _iter_queue(inbox: queue.Queue) -> Iterator[Any]:
+    while True:
+        item = inbox.get()
+        if item is _DONE:
+            return
+        yield item
+
+def _run_source(source: Iterable[Any], outbox: queue.Queue, errors: List[BaseException]) -> None:
+    try:
+        for item in source:
+            outbox.put(item)
+    except BaseException as e:
+        errors.append(e)
+    finally:
+        outbox.put(_DONE)
+
+def _run_stage(stage: Callable[[Iterator[Any]], Iterable[Any]], inbox: queue.Queue,
+               outbox: queue.Queue, errors: List[BaseException]) -> None:
+    try:
+        for item in stage(_iter_queue(inbox)):
+            outbox.put(item)
+    except BaseException as e:
+        errors.append(e)
+    finally:
+        outbox.put(_DONE)
+
+def run_pipeline(source: Iterable[Any], stages: List[Callable[[Iterator[Any]], Iterable[Any]]],
+                 queue_size: int = QUEUE_SIZE) -> Iterator[Any]:
+    """
+    將資料依序送過多個階段，每個階段在自己的執行緒中執行，階段之間以有界佇列連接。
+
+    每個階段是一個函式，輸入上一階段的迭代器並回傳新的迭代器，因此可以逐筆處理，
+    也可以自行累積成批次或在內部使用執行緒池。較慢的階段（例如 LLM 分類）執行時，
+    讀檔與寫入等 I/O 階段可以同時進行。
+
+    Args:
+        source: 資料來源，會在獨立的執行緒中讀取。
+        stages: 依序執行的階段函式。
+        queue_size (int): 每個佇列的長度上限。
+
+    Yields:
+        最後一個階段的輸出。任一階段發生例外時，會在輸出結束後重新拋出。
+    """
+    errors: List[BaseException] = []
+    inbox: queue.Queue = queue.Queue(maxsize=queue_size)
+    threads = [threading.Thread(target=_run_source, args=(source, inbox, errors), daemon=True)]
+    for stage in stages:
+        outbox: queue.Queue = queue.Queue(maxsize=queue_size)
+        threads.append(threading.Thread(target=_run_stage, args=(stage, inbox, outbox, errors), daemon=True))
+        inbox = outbox
+    for thread in threads:
+        thread.start()
+    yield from _iter_queue(inbox)
+    if errors:
+        raise errors[0]
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 快取檔位置與最多保留的筆數，CASE_TYPE_CACHE=0 可關閉快取
+CACHE_PATH = os.getenv("CASE_TYPE_CACHE_PATH", os.path.join(".cache", "case_type_cache.sqlite"))
+MAX_ENTRIES = int(os.getenv("CASE_TYPE_CACHE_MAX_ENTRIES", "50000"))
+CACHE_ENABLED = os.getenv("CASE_TYPE_CACHE", "1") != "0"
+
+def normalize_text(text: str) -> str:
+    # 去除所有空白，避免排版差異造成快取失效
+    return re.sub(r"\s+", "", text)
+
+def make_key(text: str, model: str, prompt_version: str) -> str:
+    digest = hashlib.sha256()
+    for part in (normalize_text(text), model, prompt_version):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class CaseTypeCache:
+    """
+    以 SQLite 儲存案件分類結果的磁碟快取。
+
+    以事故發生緣由文本、模型名稱與提示詞版本的雜湊作為鍵，值為 classify_case 的結果
+    （原被告名單與 §187/§188/§190 判斷）。超過 max_entries 筆時會淘汰最久未使用的資料。
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS case_info ("
+                "key TEXT PRIMARY KEY, info TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS case_info_last_used ON case_info (last_used)")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT info FROM case_info WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self._conn:
+                self._conn.execute("UPDATE case_info SET last_used = ? WHERE key = ?", (time.time(), key))
+            return json.loads(row[0])
+
+    def put(self, key: str, info: Dict[str, Any]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO case_info (key, info, last_used) VALUES (?, ?, ?)",
+                (key, json.dumps(info, ensure_ascii=False), time.time()),
+            )
+            size = self._conn.execute("SELECT COUNT(*) FROM case_info").fetchone()[0]
+            if size > self.max_entries:
+                # 一次多淘汰一成，避免每次寫入都要重新排序
+                excess = size - int(self.max_entries * 0.9)
+                self._conn.execute(
+                    "DELETE FROM case_info WHERE key IN ("
+                    "SELECT key FROM case_info ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM case_info").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": size,
+        }
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+def get_default_cache() -> Optional[CaseTypeCache]:
+    """回傳共用的快取實例；若以 CASE_TYPE_CACHE=0 關閉則回傳 None。"""
+    global _default_cache
+    if not CACHE_ENABLED:
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = CaseTypeCache()
+        return _default_cache
@@ -1,7 +1,46 @@
+import json
+import os
 import re
+from typing import Any, Dict
 from langchain.chains import LLMChain
 from langchain.prompts import PromptTemplate
 from langchain_ollama import OllamaLLM
+from case_type_cache import get_default_cache, make_key
+
+# 案件分類使用的模型
+MODEL_NAME = "kenneth85/llama-3-taiwan:8b-instruct-dpo-q8_0"
+# 分類方式：structured 為單次 JSON 輸出（失敗時退回四段提示），legacy 為原本的四段提示
+CLASSIFIER_MODE = os.getenv("CASE_TYPE_CLASSIFIER", "structured")
+# 分類提示詞的版本，修改提示詞或解析方式時需一併更新，讓舊的快取失效
+PROMPT_VERSIONS = {"legacy": "filter-v1", "structured": "structured-v2"}
+
+# 單次分類時要求模型輸出的 JSON 格式
+CASE_INFO_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "plaintiffs": {"type": "array", "items": {"type": "string"}},
+        "defendants": {"type": "array", "items": {"type": "string"}},
+        "minor": {"type": "boolean"},
+        "employee": {"type": "boolean"},
+        "animal": {"type": "boolean"},
+    },
+    "required": ["plaintiffs", "defendants", "minor", "employee", "animal"],
+}
+
+def default_llm():
+    return OllamaLLM(model=MODEL_NAME,
+                     temperature=0,
+                     keep_alive=0,
+                     )
+
+# 強制以 JSON 輸出的 LLM，供單次分類使用
+def structured_llm():
+    return OllamaLLM(model=MODEL_NAME,
+                     temperature=0,
+                     keep_alive=0,
+                     format="json",
+                     )
+
 def get_case_type(sim_input: str) -> str:
     """
     根據模擬輸入文本 sim_input 判斷案件的類型。
@@ -13,14 +52,119 @@ def get_case_type(sim_input: str) -> str:
     Returns:
         str: 案件的類型描述（例如 "數名被告+§187未成年案型"）
     """
-    case_info = generate_filter(sim_input)
-    # 分割姓名列表
+    return case_type_from_info(classify_case(sim_input))
+
+def classify_case(sim_input: str, llm=None, cache=None, mode: str = CLASSIFIER_MODE) -> Dict[str, Any]:
+    """
+    對模擬輸入做一次完整分類，回傳原被告名單與 §187/§188/§190 判斷結果。
+
+    使用預設 LLM 時會先查詢磁碟快取，相同的事故發生緣由只需呼叫一次模型。
+
+    Args:
+        sim_input (str): 用戶輸入的案件描述文字。
+        llm: 要使用的 LLM，預設為 default_llm()，測試時可傳入假的 LLM。
+        cache: 要使用的 CaseTypeCache；未指定且使用預設 LLM 時採用共用快取。
+        mode (str): "structured" 或 "legacy"，預設由 CASE_TYPE_CLASSIFIER 環境變數決定。
+
+    Returns:
+        Dict[str, Any]: 包含 plaintiffs、defendants、minor、employee、animal 的字典。
+    """
+    user_input = extract_reason(sim_input)
+    if cache is None and llm is None:
+        cache = get_default_cache()
+    if cache is None:
+        return classify_reason(user_input, llm, mode)
+
+    key = make_key(user_input, MODEL_NAME, PROMPT_VERSIONS[mode])
+    info = cache.get(key)
+    if info is None:
+        info = classify_reason(user_input, llm, mode)
+        cache.put(key, info)
+    return info
+
+def classify_reason(user_input: str, llm=None, mode: str = CLASSIFIER_MODE) -> Dict[str, Any]:
+    if mode == "structured":
+        try:
+            return classify_structured(user_input, llm)
+        except ValueError:
+            # 模型輸出不符合格式時退回四段提示
+            pass
+    return parse_case_info(filter_reason(user_input, llm))
+
+def classify_structured(user_input: str, llm=None) -> Dict[str, Any]:
+    """
+    以單次 LLM 呼叫取得原被告名單與 §187/§188/§190 判斷，並驗證輸出格式。
+
+    Raises:
+        ValueError: 模型輸出無法解析或不符合 CASE_INFO_SCHEMA。
+    """
+    llm = llm or structured_llm()
+    prompt_template = PromptTemplate(
+        input_variables=["reason", "schema"],
+        template="""
+    請你幫我從以下車禍案件的事故詳情中提取所有原告和被告的姓名，並判斷被告是否為未成年人、被告在車禍發生時是否為正在執行職務的受僱人、車禍是否由動物造成，並只能輸出符合以下 JSON Schema 的 JSON:
+    {schema}
+    範例:
+    {{"plaintiffs": ["原告1", "原告2"], "defendants": ["被告1", "被告2"], "minor": false, "employee": false, "animal": false}}
+
+    以下是本起車禍的事故詳情：
+    {reason}
+    備註:
+    如果未提及原告或被告的姓名或代稱需寫為["未提及"]
+    如果未提及被告的年齡，minor 為 false
+    如果未提及被告是否為正在執行職務的受僱人，employee 為 false
+    如果未提及車禍是否由動物造成，animal 為 false
+    你只需要輸出 JSON，不要輸出其他多餘的內容
+    """
+    )
+    llm_chain = LLMChain(llm=llm, prompt=prompt_template)
+    output = llm_chain.run({
+        "reason" : user_input,
+        "schema": json.dumps(CASE_INFO_SCHEMA, ensure_ascii=False),
+    })
+    return validate_case_info(output)
+
+# 解析並驗證單次分類的 JSON 輸出
+def validate_case_info(output: str) -> Dict[str, Any]:
+    match = re.search(r"\{.*\}", output, re.S)
+    if not match:
+        raise ValueError(f"分類結果不是 JSON：{output}")
+    try:
+        data = json.loads(match.group(0))
+    except json.JSONDecodeError as e:
+        raise ValueError(f"分類結果不是 JSON：{output}") from e
+    if not isinstance(data, dict):
+        raise ValueError(f"分類結果不是 JSON 物件：{output}")
+
+    # 依 CASE_INFO_SCHEMA 逐欄驗證，並容許模型常見的寫法（以逗號分隔的姓名、以「是/否」作答）
+    info = {}
+    for field in CASE_INFO_SCHEMA["required"]:
+        value = data.get(field)
+        kind = CASE_INFO_SCHEMA["properties"][field]["type"]
+        if kind == "array":
+            if isinstance(value, str):
+                value = re.split(r"[,、]", value)
+            if not isinstance(value, list) or not all(isinstance(name, str) for name in value):
+                raise ValueError(f"分類結果的 {field} 不是姓名列表：{output}")
+            info[field] = [name.strip() for name in value if name.strip()]
+        elif kind == "boolean":
+            if isinstance(value, str) and value in ("是", "否"):
+                value = value == "是"
+            if not isinstance(value, bool):
+                raise ValueError(f"分類結果的 {field} 不是布林值：{output}")
+            info[field] = value
+        else:
+            raise ValueError(f"CASE_INFO_SCHEMA 中 {field} 的型別不支援：{kind}")
+    return info
+
+def parse_case_info(case_info: str) -> Dict[str, Any]:
     # 正則表達式提取原告和被告姓名
     pattern = r"原告:([\u4e00-\u9fa5A-Za-z0-9○·．,、]+)"
     plaintiff_match = re.search(pattern, case_info)
     pattern = r"被告:([\u4e00-\u9fa5A-Za-z0-9○·．,、]+)"
     defendant_match = re.search(pattern, case_info)
 
+    # 分割姓名列表
     plaintiffs = re.split(r"[,、]", plaintiff_match.group(1)) if plaintiff_match else []
     defendants = re.split(r"[,、]", defendant_match.group(1)) if defendant_match else []
 
@@ -28,12 +172,23 @@ def get_case_type(sim_input: str) -> str:
     plaintiffs = [name.strip() for name in plaintiffs]
     defendants = [name.strip() for name in defendants]
 
-    #print("原告:", plaintiffs)
-    #print("被告:", defendants)
+    return {
+        "plaintiffs": plaintiffs,
+        "defendants": defendants,
+        "minor": _is_yes(case_info, "被告是否為未成年人"),
+        "employee": _is_yes(case_info, "被告是否為受僱人"),
+        "animal": _is_yes(case_info, "車禍是否由動物造成"),
+    }
 
+# 判斷某個問題的回答是否為「是」
+def _is_yes(case_info: str, question: str) -> bool:
+    match = re.search(question + r"\s*[:：]?\s*[(（]?\s*(是|否)", case_info)
+    return bool(match) and match.group(1) == "是"
+
+def case_type_from_info(info: Dict[str, Any]) -> str:
     case_type=""
-    p=len(plaintiffs)
-    d=len(defendants)
+    p=len(info["plaintiffs"])
+    d=len(info["defendants"])
     # 根據人數分類基本案型
     if p<=1 and d<=1:
         case_type="單純原被告各一"
@@ -44,31 +199,42 @@ def get_case_type(sim_input: str) -> str:
     elif p>1 and d>1:
         case_type="原被告皆數名"
 
-    match = re.search(r'被告是否為未成年人(.*?)被告是否為受僱人(.*?)車禍是否由動物造成(.*)', case_info, re.S)
-
-    if match.group(1).strip()[1] =="是":
+    if info["minor"]:
         case_type += "+§187未成年案型"
-        return case_type
-    if match.group(2).strip()[1] =="是":
+    elif info["employee"]:
         case_type += "+§188僱用人案型"
-        return case_type
-    if match.group(3).strip()[1] =="是":
+    elif info["animal"]:
         case_type += "+§190動物案型"
-        return case_type
-    
     return case_type
+
+# 將分類結果還原成與 generate_filter 相同格式的描述，作為案件屬性節點的內容
+def format_case_info(info: Dict[str, Any]) -> str:
+    def answer(flag):
+        return "是" if flag else "否"
+    return (
+        f"原告:{','.join(info['plaintiffs'])}\n"
+        f"被告:{','.join(info['defendants'])}\n"
+        f"被告是否為未成年人:{answer(info['minor'])}\n"
+        f"被告是否為受僱人:{answer(info['employee'])}\n"
+        f"車禍是否由動物造成:{answer(info['animal'])}\n"
+    )
+
 # 主函式：根據模擬輸入，回傳清洗後的描述（包含原被告姓名、是否為未成年、是否為受僱人、是否由動物造成）
-def generate_filter(sim_input: str) -> str:
+def generate_filter(sim_input: str, llm=None) -> str:
+    return filter_reason(extract_reason(sim_input), llm)
+
+# 取出模擬輸入中「一、」段落的事故發生緣由
+def extract_reason(sim_input: str) -> str:
     match = re.search(r'一、(.*?)二、(.*?)三、(.*)', sim_input, re.S)
-    user_input = match.group(1).strip()
-    filted=get_people(user_input)+"\n"+get_187(user_input)+"\n"+get_188(user_input)+"\n"+get_190(user_input)+"\n"
+    return match.group(1).strip()
+
+def filter_reason(user_input: str, llm=None) -> str:
+    llm = llm or default_llm()
+    filted=get_people(user_input, llm)+"\n"+get_187(user_input, llm)+"\n"+get_188(user_input, llm)+"\n"+get_190(user_input, llm)+"\n"
     return filted
 # 判斷是否為未成年人 (§187)
-def get_187(user_input: str) -> str:
-    llm = OllamaLLM(model="kenneth85/llama-3-taiwan:8b-instruct-dpo-q8_0",
-                    temperature=0,
-                    keep_alive=0,
-                    )
+def get_187(user_input: str, llm=None) -> str:
+    llm = llm or default_llm()
     # 創建 LLMChain
     # 定義提示模板
     prompt_template = PromptTemplate(
@@ -93,11 +259,8 @@ def get_187(user_input: str) -> str:
     #print(filtered_input)
     return filtered_input
 # 判斷是否為受僱人 (§188)
-def get_188(user_input: str) -> str:
-    llm = OllamaLLM(model="kenneth85/llama-3-taiwan:8b-instruct-dpo-q8_0",
-                    temperature=0,
-                    keep_alive=0,
-                    )
+def get_188(user_input: str, llm=None) -> str:
+    llm = llm or default_llm()
     # 創建 LLMChain
     # 定義提示模板
     prompt_template = PromptTemplate(
@@ -122,12 +285,9 @@ def get_188(user_input: str) -> str:
     #print(filtered_input)
     return filtered_input
 # 判斷是否為動物造成 (§190)
-def get_190(user_input: str) -> str:
+def get_190(user_input: str, llm=None) -> str:
 
-    llm = OllamaLLM(model="kenneth85/llama-3-taiwan:8b-instruct-dpo-q8_0",
-                    temperature=0,
-                    keep_alive=0,
-                    )
+    llm = llm or default_llm()
     # 創建 LLMChain
     # 定義提示模板
     prompt_template = PromptTemplate(
@@ -152,11 +312,8 @@ def get_190(user_input: str) -> str:
     #print(filtered_input)
     return filtered_input
 # 擷取原告與被告姓名
-def get_people(user_input: str) -> str:
-    llm = OllamaLLM(model="kenneth85/llama-3-taiwan:8b-instruct-dpo-q8_0",
-                    temperature=0,
-                    keep_alive=0,
-                    )
+def get_people(user_input: str, llm=None) -> str:
+    llm = llm or default_llm()
     # 創建 LLMChain
     # 定義提示模板
     prompt_template = PromptTemplate(
@@ -0,0 +1,66 @@
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+from index_store import DOC_FIELDS, doc_store_file, resolve_index_dir
+
+load_dotenv()
+
+# DOC_STORE=0 時一律查詢 Neo4j
+DOC_STORE_ENABLED = os.getenv("DOC_STORE", "1") != "0"
+
+class DocStore:
+    """唯讀的案件文件庫，以 case_id 取得模擬輸入、模擬輸出、法條與案件類型。"""
+
+    # SQLite 單一語句的參數數量有上限，查詢時分段
+    CHUNK_SIZE = 500
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+
+    def get_many(self, case_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """回傳找得到的案件，以 case_id 為鍵；找不到的 ID 不會出現在結果中。"""
+        unique_ids = list(dict.fromkeys(case_ids))
+        found = {}
+        with self._lock:
+            for start in range(0, len(unique_ids), self.CHUNK_SIZE):
+                chunk = unique_ids[start:start + self.CHUNK_SIZE]
+                rows = self._conn.execute(
+                    f"SELECT {', '.join(DOC_FIELDS)} FROM cases WHERE case_id IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for row in rows:
+                    found[row[0]] = dict(zip(DOC_FIELDS, row))
+        return found
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+_stores: Dict[str, DocStore] = {}
+_stores_lock = threading.Lock()
+
+def get_doc_store(index_root: str) -> Optional[DocStore]:
+    """
+    回傳索引根目錄目前版本的文件庫；沒有文件庫（例如舊版平鋪目錄）或已關閉時回傳 None。
+
+    每次呼叫都會依 CURRENT 解析版本目錄，離線構建切換版本後改用新版本的檔案。
+    舊文件庫不主動關閉，其他執行緒可能仍在使用；最後一個參照釋放時連線會隨物件一起關閉。
+    """
+    if not DOC_STORE_ENABLED:
+        return None
+    path = doc_store_file(resolve_index_dir(index_root))
+    with _stores_lock:
+        store = _stores.get(index_root)
+        if store is not None and store.path == path:
+            return store
+        if store is not None:
+            del _stores[index_root]
+        if not os.path.exists(path):
+            return None
+        store = DocStore(path)
+        _stores[index_root] = store
+        return store
@@ -0,0 +1,132 @@
+import atexit
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 快取可使用的記憶體上限（MB），以及選用的持久化檔案路徑
+MAX_MB = float(os.getenv("EMBEDDING_CACHE_MAX_MB", "64"))
+CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH")
+
+class EmbeddingCache:
+    """
+    查詢文本的嵌入向量 LRU 快取，相同文本不必重新經過 transformer。
+
+    鍵為模型名稱與文本的雜湊，容量以向量佔用的位元組數計算，超過 max_bytes 時淘汰最久未使用的向量。
+    """
+
+    def __init__(self, model_id: str, max_bytes: int = int(MAX_MB * 1024 * 1024), path: Optional[str] = None):
+        self.model_id = model_id
+        self.max_bytes = max_bytes
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_id}\0{text}".encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = self.key(text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return vector
+
+    def put(self, text: str, vector: np.ndarray) -> None:
+        self._put(self.key(text), np.asarray(vector, dtype="float32"))
+
+    def _put(self, key: str, vector: np.ndarray) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[key] = vector
+            self._bytes += vector.nbytes
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def encode(self, get_model: Callable[[], Any], texts: List[str], **kwargs) -> np.ndarray:
+        """
+        取得多筆文本的嵌入向量，只有快取中沒有的文本才會交給模型一次編碼。
+
+        get_model 只在有文本未命中時才呼叫，因此全部命中（例如由持久化的快取檔載入）時不會載入模型。
+
+        Returns:
+            np.ndarray: 依輸入順序排列的 float32 向量矩陣。
+        """
+        vectors: List[Optional[np.ndarray]] = [self.get(text) for text in texts]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            # 同一批中重複的文本只編碼一次
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            encoded = np.asarray(get_model().encode(unique_texts, show_progress_bar=False, **kwargs), dtype="float32")
+            by_text = dict(zip(unique_texts, encoded))
+            for text, vector in by_text.items():
+                self.put(text, vector)
+            for i in missing:
+                vectors[i] = by_text[texts[i]]
+        return np.vstack(vectors)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+        }
+
+    def save(self, path: Optional[str] = None) -> None:
+        path = path or self.path
+        if not path:
+            return
+        with self._lock:
+            keys = list(self._entries)
+            vectors = list(self._entries.values())
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, model_id=np.array(self.model_id), keys=np.array(keys),
+                 vectors=np.vstack(vectors) if vectors else np.zeros((0, 0), dtype="float32"))
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> None:
+        with np.load(path) as data:
+            if str(data["model_id"]) != self.model_id:
+                return
+            for key, vector in zip(data["keys"].tolist(), data["vectors"]):
+                self._put(key, vector)
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+def get_embedding_cache(model_id: str) -> EmbeddingCache:
+    """回傳此模型共用的快取；設定 EMBEDDING_CACHE_PATH 時會在啟動時載入並於結束時寫回。"""
+    with _caches_lock:
+        cache = _caches.get(model_id)
+        if cache is None:
+            path = None
+            if CACHE_PATH:
+                root, ext = os.path.splitext(CACHE_PATH)
+                path = f"{root}-{hashlib.sha256(model_id.encode('utf-8')).hexdigest()[:8]}{ext or '.npz'}"
+            cache = EmbeddingCache(model_id, path=path)
+            if path:
+                atexit.register(cache.save)
+            _caches[model_id] = cache
+        return cache
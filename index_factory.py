@@ -0,0 +1,237 @@
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import faiss
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 可用的索引類型，依記憶體與構建成本大致由低到高排列
+INDEX_KINDS = ("flat", "ivf_pq", "ivf_flat", "hnsw")
+
+# 預設的索引類型（auto 表示依 recall 目標自動挑選）與 recall@k 目標
+INDEX_KIND = os.getenv("FAISS_INDEX_KIND", "auto")
+TARGET_RECALL = float(os.getenv("FAISS_TARGET_RECALL", "0.95"))
+
+# 索引中向量的儲存格式：fp32 原始向量、fp16 半精度、sq8 每維 8-bit 純量量化（記憶體約為 fp32 的 1/2 與 1/4）
+CODECS = ("fp32", "fp16", "sq8")
+VECTOR_CODEC = os.getenv("FAISS_VECTOR_CODEC", "fp32")
+_CODEC_FACTORY = {"fp32": "Flat", "fp16": "SQfp16", "sq8": "SQ8"}
+
+# 向量數不超過此值的分片直接使用暴力搜尋，不需要任何近似索引
+FLAT_MAX_VECTORS = 1000
+# 每個 IVF 分群至少需要的訓練向量數（FAISS 建議值）
+MIN_POINTS_PER_CENTROID = 39
+
+# 自動調整時依序嘗試的查詢參數，數值越大越準確但越慢
+EF_SEARCH_CANDIDATES = (16, 32, 64, 128, 256, 512)
+NPROBE_CANDIDATES = (1, 2, 4, 8, 16, 32, 64, 128)
+
+def default_build_params(kind: str, n: int, dimension: int) -> Optional[Dict[str, Any]]:
+    """回傳某種索引在 n 筆向量下的預設構建參數；資料量不足以構建時回傳 None。"""
+    if kind == "flat":
+        return {}
+    if kind == "hnsw":
+        return {"M": 32, "efConstruction": 200}
+    nlist = min(int(4 * np.sqrt(n)), n // MIN_POINTS_PER_CENTROID)
+    if nlist < 8:
+        return None
+    if kind == "ivf_flat":
+        return {"nlist": nlist}
+    if kind == "ivf_pq":
+        # PQ 需要每個子空間 256 個中心點的訓練資料
+        m = next((m for m in (dimension // 16, dimension // 8) if m and dimension % m == 0), None)
+        if m is None or n < 256 * MIN_POINTS_PER_CENTROID:
+            return None
+        return {"nlist": nlist, "m": m, "nbits": 8}
+    raise ValueError(f"未知的索引類型：{kind}")
+
+def factory_string(kind: str, build_params: Dict[str, Any], codec: str = VECTOR_CODEC) -> str:
+    """回傳 faiss.index_factory 的描述字串；ivf_pq 本身即為量化儲存，不套用 codec。"""
+    if codec not in _CODEC_FACTORY:
+        raise ValueError(f"未知的向量格式：{codec}")
+    storage = _CODEC_FACTORY[codec]
+    if kind == "flat":
+        return storage
+    if kind == "hnsw":
+        return f"HNSW{build_params['M']}" if codec == "fp32" else f"HNSW{build_params['M']},{storage}"
+    if kind == "ivf_flat":
+        return f"IVF{build_params['nlist']},{storage}"
+    if kind == "ivf_pq":
+        return f"IVF{build_params['nlist']},PQ{build_params['m']}x{build_params['nbits']}"
+    raise ValueError(f"未知的索引類型：{kind}")
+
+def make_index(kind: str, embeddings: np.ndarray, build_params: Optional[Dict[str, Any]] = None,
+               codec: str = VECTOR_CODEC) -> faiss.Index:
+    """
+    依類型構建並填入向量的 FAISS 索引。
+
+    Args:
+        kind (str): flat、hnsw、ivf_flat 或 ivf_pq。
+        embeddings (np.ndarray): float32 向量矩陣。
+        build_params: 構建參數，預設使用 default_build_params。
+        codec (str): 向量儲存格式，fp32、fp16 或 sq8。
+    """
+    n, dimension = embeddings.shape
+    params = build_params if build_params is not None else default_build_params(kind, n, dimension)
+    if params is None:
+        raise ValueError(f"{n} 筆向量不足以構建 {kind} 索引")
+    index = faiss.index_factory(dimension, factory_string(kind, params, codec))
+    if kind == "hnsw":
+        index.hnsw.efConstruction = params["efConstruction"]
+        index.hnsw.efSearch = 100
+    # IVF 的分群與 sq8 的每維範圍都需要先訓練
+    if not index.is_trained:
+        index.train(embeddings)
+    index.add(embeddings)
+    return index
+
+def set_search_params(index: faiss.Index, search_params: Dict[str, Any]) -> None:
+    # 查詢參數會隨索引一起寫入檔案
+    if "efSearch" in search_params:
+        index.hnsw.efSearch = search_params["efSearch"]
+    if "nprobe" in search_params:
+        faiss.extract_index_ivf(index).nprobe = search_params["nprobe"]
+
+def search_param_candidates(kind: str, build_params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    if kind == "hnsw":
+        return [{"efSearch": ef} for ef in EF_SEARCH_CANDIDATES]
+    if kind in ("ivf_flat", "ivf_pq"):
+        return [{"nprobe": p} for p in NPROBE_CANDIDATES if p <= build_params["nlist"]]
+    return [{}]
+
+def exact_search(embeddings: np.ndarray, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    # 暴力搜尋的結果作為 ground truth
+    index = faiss.IndexFlatL2(embeddings.shape[1])
+    index.add(embeddings)
+    return index.search(queries, k)
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray, k: int) -> float:
+    """每筆查詢前 k 個結果中找到真正前 k 近鄰的比例平均。"""
+    k = min(k, truth.shape[1], found.shape[1])
+    if k == 0 or len(truth) == 0:
+        return 1.0
+    hits = 0
+    for found_row, truth_row in zip(found[:, :k], truth[:, :k]):
+        expected = {int(i) for i in truth_row if i >= 0}
+        hits += len(expected & {int(i) for i in found_row if i >= 0}) / max(1, len(expected))
+    return hits / len(truth)
+
+def holdout_split(n: int, max_queries: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """隨機留出至多 max_queries（且不超過 1/5）個位置作為查詢，回傳 (索引資料的位置, 查詢的位置)。"""
+    n_queries = min(max_queries, max(1, n // 5))
+    order = np.random.default_rng(seed).permutation(n)
+    return np.sort(order[n_queries:]), np.sort(order[:n_queries])
+
+def filtered_search_params(index: faiss.Index, selector) -> faiss.SearchParameters:
+    """回傳帶有 IDSelector、並沿用索引本身 efSearch/nprobe 的查詢參數。"""
+    if hasattr(index, "hnsw"):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    if isinstance(index, faiss.IndexIVF):
+        # IVF 索引只接受 SearchParametersIVF，需帶上索引本身的 nprobe
+        return faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+    return faiss.SearchParameters(sel=selector)
+
+def _label_groups(base_labels: np.ndarray, query_labels: np.ndarray) -> List[Tuple[np.ndarray, np.ndarray]]:
+    # 每個查詢標籤對應 (查詢的位置, 同標籤的索引資料位置)
+    groups = []
+    for label in np.unique(query_labels):
+        rows = np.flatnonzero(base_labels == label).astype("int64")
+        if len(rows):
+            groups.append((np.flatnonzero(query_labels == label), rows))
+    return groups
+
+def tune_index(embeddings: np.ndarray, target_recall: float = 0.95, k: int = 5,
+               kinds: Tuple[str, ...] = INDEX_KINDS, sample_size: int = 200,
+               seed: int = 0, codec: str = VECTOR_CODEC,
+               labels: Optional[np.ndarray] = None) -> Tuple[faiss.Index, Dict[str, Any]]:
+    """
+    為一個分片挑選達到 recall@k 目標、且平均查詢時間最短的索引類型與查詢參數。
+
+    向量數不超過 FLAT_MAX_VECTORS 時直接使用 flat。其餘情況留出部分向量作為查詢（不放入試驗用的索引，
+    避免查詢本身必定命中而高估 recall），與暴力搜尋的結果比較；每種索引由最便宜的查詢參數開始嘗試，
+    取第一個達標的設定，再從各類型中選出最快的一個，最後以全部向量依選定的設定重新構建。都無法達標時退回 flat。
+    codec 為 fp16/sq8 時比較的是量化後的索引，因此量化造成的 recall 損失也會計入。
+
+    Args:
+        labels (Optional[np.ndarray]): 每個向量的分類代碼（例如單一索引的案件類型）。
+            指定時每筆查詢只在同代碼的向量中搜尋，以篩選後的 recall 挑選設定。
+
+    Returns:
+        Tuple[faiss.Index, Dict[str, Any]]: 索引，以及記錄 kind、codec、build、search、recall、latency_ms 的設定。
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+    n, dimension = embeddings.shape
+    if n <= FLAT_MAX_VECTORS or tuple(kinds) == ("flat",):
+        return make_index("flat", embeddings, codec=codec), {"kind": "flat", "codec": codec, "build": {}, "search": {}}
+
+    base_positions, query_positions = holdout_split(n, sample_size, seed)
+    base = np.ascontiguousarray(embeddings[base_positions])
+    queries = np.ascontiguousarray(embeddings[query_positions])
+    if labels is None:
+        _, truth = exact_search(base, queries, k)
+
+        def search(index):
+            return index.search(queries, k)[1]
+    else:
+        labels = np.asarray(labels)
+        groups = _label_groups(labels[base_positions], labels[query_positions])
+        truth = np.full((len(queries), k), -1, dtype="int64")
+        for positions, rows in groups:
+            _, local = exact_search(base[rows], queries[positions], k)
+            truth[positions] = np.where(local >= 0, rows[np.maximum(local, 0)], -1)
+
+        def search(index):
+            found = np.full((len(queries), k), -1, dtype="int64")
+            for positions, rows in groups:
+                selector = faiss.IDSelectorBatch(len(rows), faiss.swig_ptr(rows))
+                found[positions] = index.search(queries[positions], k, params=filtered_search_params(index, selector))[1]
+            return found
+
+    best: Optional[Dict[str, Any]] = None
+    for kind in kinds:
+        if kind == "flat":
+            continue
+        build_params = default_build_params(kind, len(base), dimension)
+        if build_params is None:
+            continue
+        index = make_index(kind, base, build_params, codec)
+        for search_params in search_param_candidates(kind, build_params):
+            set_search_params(index, search_params)
+            start = time.perf_counter()
+            found = search(index)
+            latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+            recall = recall_at_k(found, truth, k)
+            if recall >= target_recall:
+                spec = {"kind": kind, "codec": codec, "build": build_params, "search": search_params,
+                        "recall": round(recall, 4), "latency_ms": round(latency_ms, 4)}
+                if best is None or spec["latency_ms"] < best["latency_ms"]:
+                    best = spec
+                break
+    if best is None:
+        return make_index("flat", embeddings, codec=codec), {"kind": "flat", "codec": codec, "build": {}, "search": {}}
+    index = make_index(best["kind"], embeddings, best["build"], codec)
+    set_search_params(index, best["search"])
+    return index, best
+
+def build_index(embeddings: np.ndarray, kind: str = INDEX_KIND, target_recall: float = TARGET_RECALL,
+                k: int = 5, codec: str = VECTOR_CODEC, labels: Optional[np.ndarray] = None) -> Tuple[faiss.Index, Dict[str, Any]]:
+    """
+    依指定類型構建索引；kind 為 auto 時以 tune_index 自動挑選，labels 表示查詢時會依代碼篩選。
+    向量數不足以構建指定類型（例如 IVF 的分群）時改用 flat，並在設定的 requested 中記錄原本指定的類型。
+    """
+    if kind == "auto":
+        return tune_index(embeddings, target_recall, k, codec=codec, labels=labels)
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+    build_params = default_build_params(kind, *embeddings.shape)
+    if build_params is None:
+        return make_index("flat", embeddings, codec=codec), {"kind": "flat", "codec": codec, "build": {}, "search": {},
+                                                             "requested": kind}
+    index = make_index(kind, embeddings, build_params, codec)
+    search_params: Dict[str, Any] = {}
+    if kind == "hnsw":
+        search_params = {"efSearch": index.hnsw.efSearch}
+    elif kind in ("ivf_flat", "ivf_pq"):
+        search_params = {"nprobe": faiss.extract_index_ivf(index).nprobe}
+    return index, {"kind": kind, "codec": codec, "build": build_params, "search": search_params}
@@ -0,0 +1,508 @@
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import faiss
+import numpy as np
+from index_factory import INDEX_KIND, TARGET_RECALL, VECTOR_CODEC, build_index, exact_search, filtered_search_params
+
+# 索引集合的目錄結構：
+#   <root>/CURRENT                 目前使用中的版本名稱
+#   <root>/versions/<version>/     完整的一組索引，包含 manifest.json 與每個案件類型的檔案
+# 沒有 CURRENT 檔時視為舊版的平鋪目錄（索引檔直接放在 <root> 底下）
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+MANIFEST_FILE = "manifest.json"
+
+# 建立向量索引的欄位（模擬輸入的三個部分）。預設欄位事故發生緣由的檔案直接放在版本目錄下，
+# 其餘欄位放在 <version>/fields/<欄位>/，檔案結構與預設欄位相同
+DEFAULT_FIELD = "事故發生緣由"
+EMBED_FIELDS = (DEFAULT_FIELD, "受傷情形", "賠償根據")
+FIELDS_DIR = "fields"
+
+def field_dir(index_dir: str, field: str = DEFAULT_FIELD) -> str:
+    return index_dir if field == DEFAULT_FIELD else os.path.join(index_dir, FIELDS_DIR, field)
+
+# 每個案件類型的檔案：
+#   <type>_index.faiss   FAISS 索引，以 mmap 開啟
+#   <type>_ids.npy       案件 ID（int64）
+#   <type>_texts.bin     所有事故發生緣由以 UTF-8 串接
+#   <type>_offsets.npy   每段文本在 texts.bin 中的起訖位置（int64，長度為 n + 1）
+# 舊版的 <type>_metadata.npy 以 pickle 儲存，僅作為讀取時的備援
+def index_file(index_dir: str, case_type: str) -> str:
+    return os.path.join(index_dir, f"{case_type}_index.faiss")
+
+def ids_file(index_dir: str, case_type: str) -> str:
+    return os.path.join(index_dir, f"{case_type}_ids.npy")
+
+def texts_file(index_dir: str, case_type: str) -> str:
+    return os.path.join(index_dir, f"{case_type}_texts.bin")
+
+def offsets_file(index_dir: str, case_type: str) -> str:
+    return os.path.join(index_dir, f"{case_type}_offsets.npy")
+
+def metadata_file(index_dir: str, case_type: str) -> str:
+    return os.path.join(index_dir, f"{case_type}_metadata.npy")
+
+def shard_files(index_dir: str, case_type: str) -> List[str]:
+    return [
+        index_file(index_dir, case_type),
+        ids_file(index_dir, case_type),
+        texts_file(index_dir, case_type),
+        offsets_file(index_dir, case_type),
+    ]
+
+class TextBlob:
+    """以 mmap 讀取的文本列表，只有被存取的文本才會解碼。"""
+
+    def __init__(self, path: str, offsets: np.ndarray):
+        self._offsets = offsets
+        with open(path, "rb") as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else b""
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._buffer[int(self._offsets[i]):int(self._offsets[i + 1])].decode("utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+def read_index_mmap(path: str) -> faiss.Index:
+    """
+    以 mmap 開啟索引，讓多個行程透過 OS 快取共用記憶體，且只有被存取的頁面才會常駐。
+
+    IO_FLAG_MMAP 只會 mmap IVF 的倒排列表，Flat 與 HNSW 仍會整個讀進記憶體；
+    這些索引需要 IO_FLAG_MMAP_IFC（FAISS 1.8 起）才會直接使用檔案中的向量。
+    IVF 索引（檔頭為 Iw*/Iv*）與較舊的 FAISS 使用 IO_FLAG_MMAP，都不支援時改為一般讀取。
+    """
+    with open(path, "rb") as f:
+        is_ivf = f.read(2) in (b"Iw", b"Iv")
+    flag = faiss.IO_FLAG_MMAP
+    if not is_ivf and hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        flag = faiss.IO_FLAG_MMAP_IFC
+    try:
+        return faiss.read_index(path, flag | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        return faiss.read_index(path)
+
+def load_shard(index_dir: str, case_type: str) -> Optional[Tuple[faiss.Index, Any, Any]]:
+    """
+    載入單一案件類型的索引、案件 ID 與文本，找不到時回傳 None。
+
+    新格式的案件 ID 與文本都以 mmap 開啟，不需要 pickle；舊格式則退回讀取 _metadata.npy。
+    """
+    index_path = index_file(index_dir, case_type)
+    if not os.path.exists(index_path):
+        return None
+    if all(os.path.exists(path) for path in shard_files(index_dir, case_type)):
+        case_ids = np.load(ids_file(index_dir, case_type), mmap_mode="r")
+        offsets = np.load(offsets_file(index_dir, case_type), mmap_mode="r")
+        reason_texts = TextBlob(texts_file(index_dir, case_type), offsets)
+        return read_index_mmap(index_path), case_ids, reason_texts
+    if os.path.exists(metadata_file(index_dir, case_type)):
+        metadata = np.load(metadata_file(index_dir, case_type), allow_pickle=True).item()
+        return faiss.read_index(index_path), metadata["case_ids"], metadata["reason_texts"]
+    return None
+
+def list_case_types(index_dir: str, field: str = DEFAULT_FIELD) -> List[str]:
+    """回傳索引目錄中某個欄位有索引檔的案件類型（不含單一索引）。"""
+    manifest = load_manifest(index_dir)
+    if manifest is not None:
+        if field == DEFAULT_FIELD:
+            return sorted(manifest["shards"])
+        return sorted(manifest.get("fields", {}).get(field, {}).get("shards", {}))
+    index_dir = field_dir(index_dir, field)
+    if not os.path.isdir(index_dir):
+        return []
+    suffix = "_index.faiss"
+    return sorted(name[:-len(suffix)] for name in os.listdir(index_dir)
+                  if name.endswith(suffix) and name[:-len(suffix)] != UNIFIED_NAME)
+
+def current_version(root: str) -> Optional[str]:
+    try:
+        with open(os.path.join(root, CURRENT_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def resolve_index_dir(root: str) -> str:
+    """回傳目前使用中的索引目錄；沒有版本化的索引集合時回傳 root 本身。"""
+    version = current_version(root)
+    if version is None:
+        return root
+    return os.path.join(root, VERSIONS_DIR, version)
+
+def load_manifest(index_dir: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(index_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def write_shard(index_dir: str, case_type: str, index: faiss.Index, case_ids: List[Any], reason_texts: List[str]) -> None:
+    faiss.write_index(index, index_file(index_dir, case_type))
+    write_metadata(index_dir, case_type, case_ids, reason_texts)
+
+def write_metadata(index_dir: str, case_type: str, case_ids: List[Any], reason_texts: List[str]) -> None:
+    np.save(ids_file(index_dir, case_type), np.asarray(case_ids, dtype="int64"))
+    encoded = [text.encode("utf-8") for text in reason_texts]
+    offsets = np.zeros(len(encoded) + 1, dtype="int64")
+    offsets[1:] = np.cumsum([len(text) for text in encoded])
+    np.save(offsets_file(index_dir, case_type), offsets)
+    with open(texts_file(index_dir, case_type), "wb") as f:
+        f.write(b"".join(encoded))
+
+def convert_legacy_dir(index_dir: str) -> List[str]:
+    """將目錄中舊版 pickle 格式的 _metadata.npy 轉成新格式，回傳轉換的案件類型。"""
+    converted = []
+    for name in sorted(os.listdir(index_dir)):
+        if not name.endswith("_metadata.npy"):
+            continue
+        case_type = name[:-len("_metadata.npy")]
+        metadata = np.load(os.path.join(index_dir, name), allow_pickle=True).item()
+        write_metadata(index_dir, case_type, metadata["case_ids"], metadata["reason_texts"])
+        converted.append(case_type)
+    return converted
+
+def group_by_case_type(records: List[Dict[str, Any]]) -> Dict[str, Dict[str, List[Any]]]:
+    """將 {id, text, embedding, case_type} 記錄依案件類型分組。"""
+    data_by_type: Dict[str, Dict[str, List[Any]]] = {}
+    for record in records:
+        data = data_by_type.setdefault(record["case_type"], {'embeddings': [], 'case_ids': [], 'reason_texts': []})
+        data['case_ids'].append(record["id"])
+        data['reason_texts'].append(record["text"])
+        data['embeddings'].append(np.asarray(record["embedding"], dtype="float32"))
+    return data_by_type
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# 案件文件庫：與索引同版本的 SQLite 檔，讓查詢結果不需回 Neo4j 就能取得模擬輸入、模擬輸出與法條
+DOC_STORE_FILE = "cases.sqlite"
+# 每個案件的欄位，與 Neo4j_Query.get_cases 的回傳格式相同
+DOC_FIELDS = ("case_id", "siminput", "simoutput", "statute", "case_type")
+
+def doc_store_file(index_dir: str) -> str:
+    return os.path.join(index_dir, DOC_STORE_FILE)
+
+def write_doc_store(index_dir: str, documents: List[Dict[str, Any]]) -> str:
+    """將案件文件寫成索引目錄中的 SQLite 檔，回傳檔案路徑。"""
+    path = doc_store_file(index_dir)
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            conn.execute(
+                "CREATE TABLE cases (case_id INTEGER PRIMARY KEY, siminput TEXT, simoutput TEXT, "
+                "statute TEXT, case_type TEXT)"
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO cases VALUES (?, ?, ?, ?, ?)",
+                [tuple(document.get(field) for field in DOC_FIELDS) for document in documents],
+            )
+    finally:
+        conn.close()
+    return path
+
+def _write_shards(index_dir: str, records: List[Dict[str, Any]], index_kind: str, target_recall: float,
+                  codec: str, root_dir: str) -> Dict[str, Dict[str, Any]]:
+    # files 以相對於版本目錄的路徑為鍵，verify_index_set 可直接找到欄位子目錄中的檔案
+    os.makedirs(index_dir, exist_ok=True)
+    shards = {}
+    for case_type, data in sorted(group_by_case_type(records).items()):
+        embeddings = np.vstack(data['embeddings']).astype("float32")
+        index, spec = build_index(embeddings, index_kind, target_recall, codec=codec)
+        write_shard(index_dir, case_type, index, data['case_ids'], data['reason_texts'])
+        shards[case_type] = {
+            "count": len(data['case_ids']),
+            "index": spec,
+            "files": {os.path.relpath(path, root_dir): _sha256(path) for path in shard_files(index_dir, case_type)},
+        }
+    return shards
+
+def write_index_set(root: str, records: List[Dict[str, Any]], model_name: str, source: str,
+                    keep: int = 3, unified: bool = False, index_kind: str = INDEX_KIND,
+                    target_recall: float = TARGET_RECALL, codec: str = VECTOR_CODEC,
+                    field_records: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+                    documents: Optional[List[Dict[str, Any]]] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    將所有事故發生緣由的嵌入寫成一組新的版本化索引，完成後再原子地切換 CURRENT。
+
+    新版本先寫在暫存目錄，所有檔案與 manifest 都寫好後才改名並更新 CURRENT，
+    因此查詢中的行程不會讀到寫到一半的檔案；舊版本會保留 keep 個供仍在使用的行程讀取。
+
+    Args:
+        root (str): 索引根目錄，例如 case_index_3068。
+        records: {id, text, embedding, case_type} 記錄。
+        model_name (str): 產生嵌入所用的模型名稱。
+        source (str): 資料來源說明（例如 neo4j 或匯出檔路徑）。
+        keep (int): 保留的版本數（包含新版本）。
+        unified (bool): 是否另外構建包含所有案件類型的單一索引。
+        index_kind (str): 索引類型，auto 時每個分片各自挑選達到 target_recall 的最快索引。
+        target_recall (float): 自動挑選時的 recall@k 目標。
+        codec (str): 索引中向量的儲存格式，fp32、fp16 或 sq8。
+        field_records: 其餘欄位（受傷情形、賠償根據）的記錄，會與預設欄位寫在同一個版本中。
+        documents: 案件文件（DOC_FIELDS），會寫成同版本的 cases.sqlite。
+
+    Returns:
+        Tuple[str, Dict[str, Any]]: 新版本名稱與 manifest。
+    """
+    versions_root = os.path.join(root, VERSIONS_DIR)
+    os.makedirs(versions_root, exist_ok=True)
+    version = time.strftime("%Y%m%d-%H%M%S")
+    while os.path.exists(os.path.join(versions_root, version)):
+        version += "_"
+    staging_dir = os.path.join(versions_root, f".{version}.tmp")
+    os.makedirs(staging_dir)
+
+    try:
+        shards = _write_shards(staging_dir, records, index_kind, target_recall, codec, staging_dir)
+        dimension = len(records[0]["embedding"]) if records else None
+
+        manifest = {
+            "version": version,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "model_name": model_name,
+            "dimension": dimension,
+            "source": source,
+            "total_count": sum(shard["count"] for shard in shards.values()),
+            "shards": shards,
+        }
+        if unified and records:
+            case_types, spec = write_unified(staging_dir, records, index_kind, target_recall, codec)
+            manifest["unified"] = {
+                "count": len(records),
+                "index": spec,
+                "case_types": case_types,
+                "files": {os.path.basename(path): _sha256(path) for path in unified_files(staging_dir)},
+            }
+        if field_records:
+            manifest["fields"] = {}
+            for field, recs in sorted(field_records.items()):
+                field_shards = _write_shards(field_dir(staging_dir, field), recs, index_kind, target_recall, codec,
+                                             staging_dir)
+                manifest["fields"][field] = {
+                    "total_count": sum(shard["count"] for shard in field_shards.values()),
+                    "shards": field_shards,
+                }
+        if documents:
+            path = write_doc_store(staging_dir, documents)
+            manifest["documents"] = {"count": len(documents), "files": {os.path.basename(path): _sha256(path)}}
+        with open(os.path.join(staging_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+    except BaseException:
+        # 構建失敗時不留下寫到一半的暫存目錄（prune_versions 不會處理暫存目錄）
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+    os.rename(staging_dir, os.path.join(versions_root, version))
+    pointer_tmp = os.path.join(root, f".{CURRENT_FILE}.tmp")
+    with open(pointer_tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(pointer_tmp, os.path.join(root, CURRENT_FILE))
+
+    prune_versions(root, keep)
+    return version, manifest
+
+def prune_versions(root: str, keep: int) -> None:
+    # 刪除最舊的版本，但絕不刪除目前使用中的版本
+    versions_root = os.path.join(root, VERSIONS_DIR)
+    current = current_version(root)
+    versions = sorted(v for v in os.listdir(versions_root) if not v.startswith("."))
+    for version in versions[:max(0, len(versions) - keep)]:
+        if version != current:
+            shutil.rmtree(os.path.join(versions_root, version), ignore_errors=True)
+
+def verify_index_set(index_dir: str) -> List[str]:
+    """依 manifest 檢查檔案是否完整，回傳不符的檔案名稱。"""
+    manifest = load_manifest(index_dir)
+    if manifest is None:
+        return [MANIFEST_FILE]
+    bad = []
+    shards = list(manifest["shards"].values())
+    if "unified" in manifest:
+        shards.append(manifest["unified"])
+    if "documents" in manifest:
+        shards.append(manifest["documents"])
+    for field in manifest.get("fields", {}).values():
+        shards.extend(field["shards"].values())
+    for shard in shards:
+        for name, checksum in shard["files"].items():
+            path = os.path.join(index_dir, name)
+            if not os.path.exists(path) or _sha256(path) != checksum:
+                bad.append(name)
+    return bad
+
+# 單一索引：所有事故發生緣由放在同一個索引中，另以 _unified_types.npy 記錄每個向量的案件類型代碼，
+# 查詢時以 IDSelector 篩選案件類型，不足 top_k 時再依序擴大到相近的案件類型
+UNIFIED_NAME = "_unified"
+# 篩選範圍不超過 top_k 的這個倍數，或不超過全部向量的這個比例時，直接取回向量做暴力搜尋；
+# 近似索引在篩選範圍很小時常找不齊同類型的近鄰
+EXACT_SEARCH_TOP_K_FACTOR = 20
+EXACT_SEARCH_FRACTION = 0.05
+
+def unified_types_file(index_dir: str) -> str:
+    return os.path.join(index_dir, f"{UNIFIED_NAME}_types.npy")
+
+def unified_type_names_file(index_dir: str) -> str:
+    return os.path.join(index_dir, f"{UNIFIED_NAME}_type_names.json")
+
+def unified_files(index_dir: str) -> List[str]:
+    return shard_files(index_dir, UNIFIED_NAME) + [unified_types_file(index_dir), unified_type_names_file(index_dir)]
+
+def write_unified(index_dir: str, records: List[Dict[str, Any]], index_kind: str = INDEX_KIND,
+                  target_recall: float = TARGET_RECALL, codec: str = VECTOR_CODEC) -> Tuple[List[str], Dict[str, Any]]:
+    case_types = sorted({record["case_type"] for record in records})
+    codes = {case_type: code for code, case_type in enumerate(case_types)}
+    embeddings = np.vstack([np.asarray(record["embedding"], dtype="float32") for record in records])
+    type_codes = np.array([codes[record["case_type"]] for record in records], dtype="int32")
+    # 單一索引只會以案件類型篩選搜尋，因此以篩選後的 recall 挑選設定
+    index, spec = build_index(embeddings, index_kind, target_recall, codec=codec, labels=type_codes)
+    write_shard(index_dir, UNIFIED_NAME, index, [record["id"] for record in records], [record["text"] for record in records])
+    np.save(unified_types_file(index_dir), type_codes)
+    with open(unified_type_names_file(index_dir), "w", encoding="utf-8") as f:
+        json.dump(case_types, f, ensure_ascii=False)
+    return case_types, spec
+
+def neighbour_types(case_type: str, known_types: List[str]) -> List[List[str]]:
+    """
+    回傳依序擴大搜尋的案件類型群組：
+    先找法條案型（+§187/§188/§190）相同者，再找原被告人數相同者，最後是其餘所有類型。
+    """
+    base, _, suffix = case_type.partition("+")
+    others = [t for t in known_types if t != case_type]
+    same_suffix = [t for t in others if t.partition("+")[2] == suffix]
+    same_base = [t for t in others if t.partition("+")[0] == base and t not in same_suffix]
+    rest = [t for t in others if t not in same_suffix and t not in same_base]
+    return [group for group in (same_suffix, same_base, rest) if group]
+
+class UnifiedIndex:
+    """包含所有案件類型的單一索引，支援依案件類型篩選的搜尋。"""
+
+    def __init__(self, index: faiss.Index, case_ids: Any, reason_texts: Any, type_codes: np.ndarray, type_names: List[str]):
+        self.index = index
+        self.case_ids = case_ids
+        self.reason_texts = reason_texts
+        self.type_codes = type_codes
+        self.type_names = type_names
+        self._codes = {name: code for code, name in enumerate(type_names)}
+        self._rows: Dict[Tuple[str, ...], np.ndarray] = {}
+        self._selectors: Dict[Tuple[str, ...], Any] = {}
+        self._vectors: Dict[Tuple[str, ...], np.ndarray] = {}
+
+    def _type_rows(self, case_types: Tuple[str, ...]) -> np.ndarray:
+        rows = self._rows.get(case_types)
+        if rows is None:
+            codes = [self._codes[t] for t in case_types if t in self._codes]
+            rows = np.flatnonzero(np.isin(self.type_codes, codes)).astype("int64")
+            self._rows[case_types] = rows
+        return rows
+
+    def _selector(self, case_types: Tuple[str, ...]):
+        selector = self._selectors.get(case_types)
+        if selector is None:
+            ids = self._type_rows(case_types)
+            # IDSelectorBatch 會複製 ID，不需要另外保留 ids 陣列
+            selector = faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids))
+            self._selectors[case_types] = selector
+        return selector
+
+    def _reconstruct(self, rows: np.ndarray) -> np.ndarray:
+        # IVF 索引需要 direct map 才能依位置取回向量
+        if isinstance(self.index, faiss.IndexIVF) and self.index.direct_map.no():
+            self.index.make_direct_map()
+        return self.index.reconstruct_batch(rows)
+
+    def _exact_search(self, queries: np.ndarray, rows: np.ndarray, top_k: int, vectors: Optional[np.ndarray] = None):
+        if vectors is None:
+            vectors = self._reconstruct(rows)
+        distances, local = exact_search(vectors, queries, top_k)
+        # 把篩選範圍內的位置換回單一索引中的位置，找不到的仍為 -1
+        return distances, np.where(local >= 0, rows[np.maximum(local, 0)], -1)
+
+    def _search(self, queries: np.ndarray, case_types: Tuple[str, ...], top_k: int):
+        rows = self._type_rows(case_types)
+        if len(rows) == 0:
+            return np.empty((len(queries), 0), dtype="float32"), np.empty((len(queries), 0), dtype="int64")
+        if len(rows) <= max(EXACT_SEARCH_TOP_K_FACTOR * top_k, EXACT_SEARCH_FRACTION * self.index.ntotal):
+            vectors = self._vectors.get(case_types)
+            if vectors is None:
+                vectors = self._reconstruct(rows)
+                self._vectors[case_types] = vectors
+            return self._exact_search(queries, rows, top_k, vectors)
+
+        params = filtered_search_params(self.index, self._selector(case_types))
+        if hasattr(self.index, "hnsw"):
+            params.efSearch = max(params.efSearch, top_k)
+        distances, indices = self.index.search(queries, top_k, params=params)
+        # 近似搜尋沒找齊時改以暴力搜尋補齊，確保同類型的結果用完後才擴大到其他類型
+        short = np.flatnonzero((indices >= 0).sum(axis=1) < min(top_k, len(rows)))
+        if len(short):
+            distances[short], indices[short] = self._exact_search(queries[short], rows, top_k)
+        return distances, indices
+
+    def _hit(self, dist: float, idx: int) -> Dict[str, Any]:
+        return {
+            "id": int(self.case_ids[idx]),
+            "text": self.reason_texts[idx],
+            "distance": float(dist),
+            "case_type": self.type_names[int(self.type_codes[idx])],
+        }
+
+    def search(self, queries: np.ndarray, case_types: List[str], top_k: int,
+               fallback=neighbour_types) -> List[List[Dict[str, Any]]]:
+        """
+        對每筆查詢只在其案件類型中搜尋；結果不足 top_k 時依 fallback 回傳的群組逐步擴大。
+        篩選範圍較小的群組以暴力搜尋取得完整結果，因此只有該類型的案件真的不足 top_k 時才會擴大。
+
+        Args:
+            queries (np.ndarray): 查詢向量矩陣。
+            case_types (List[str]): 每筆查詢的案件類型。
+            top_k (int): 每筆查詢返回的數量。
+            fallback: (case_type, known_types) -> 類型群組列表；None 表示不擴大搜尋。
+
+        Returns:
+            List[List[Dict[str, Any]]]: 依輸入順序排列的結果，每筆含 id、text、distance、case_type。
+        """
+        results: List[List[Dict[str, Any]]] = [[] for _ in case_types]
+        positions_by_type: Dict[str, List[int]] = {}
+        for position, case_type in enumerate(case_types):
+            positions_by_type.setdefault(case_type, []).append(position)
+
+        for case_type, positions in positions_by_type.items():
+            groups = [[case_type]]
+            if fallback is not None:
+                groups += fallback(case_type, self.type_names)
+            pending = positions
+            for group in groups:
+                distances, indices = self._search(queries[pending], tuple(group), top_k)
+                for position, row_distances, row_indices in zip(pending, distances, indices):
+                    hits = results[position]
+                    for dist, idx in zip(row_distances, row_indices):
+                        if idx >= 0 and len(hits) < top_k:
+                            hits.append(self._hit(dist, idx))
+                pending = [position for position in pending if len(results[position]) < top_k]
+                if not pending:
+                    break
+        return results
+
+def load_unified(index_dir: str) -> Optional[UnifiedIndex]:
+    if not all(os.path.exists(path) for path in unified_files(index_dir)):
+        return None
+    index, case_ids, reason_texts = load_shard(index_dir, UNIFIED_NAME)
+    with open(unified_type_names_file(index_dir), encoding="utf-8") as f:
+        type_names = json.load(f)
+    return UnifiedIndex(index, case_ids, reason_texts, np.load(unified_types_file(index_dir)), type_names)
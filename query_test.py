@@ -1,13 +1,14 @@
-import pandas as pd
+from build_pipeline import iter_excel_rows
 from define_case_type import get_case_type
-from KG_Faiss_Query_3068 import query_faiss
-df = pd.read_excel("data_50.xlsx")
-for index, row in df.iterrows():
-    sim_input = row.iloc[0]
-    case_type=get_case_type(sim_input)
-    cases=query_faiss(sim_input,case_type)
-    ids=[]
-    for case in cases:
-        ids.append(case["id"])
-    with open("test_result.txt", "a", encoding="utf-8") as f:
-        f.write(f"{ids}\n")
+from KG_Faiss_Query_3068 import query_faiss_batch
+
+if __name__ == "__main__":
+    sim_inputs = [row[0] for row in iter_excel_rows("data_50.xlsx")]
+    case_types = [get_case_type(sim_input) for sim_input in sim_inputs]
+    # 所有資料一次編碼，並依案件類型分組搜尋
+    for cases in query_faiss_batch(sim_inputs, case_types):
+        ids=[]
+        for case in cases:
+            ids.append(case["id"])
+        with open("test_result.txt", "a", encoding="utf-8") as f:
+            f.write(f"{ids}\n")
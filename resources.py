@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Tuple
+from dotenv import load_dotenv
+
+# 加載 .env 配置
+load_dotenv()
+
+# 事故發生緣由嵌入所用的模型，建圖、構建索引與查詢都必須相同
+MODEL_NAME = "shibing624/text2vec-base-chinese"
+
+# 資料集名稱對應的索引根目錄，Neo4j 連線設定為 NEO4J_URI_<名稱> 與 NEO4J_PASSWORD_<名稱>
+DATASETS = {
+    "50": "case_index_50",
+    "3068": "case_index_3068",
+}
+
+# Google Sheets API 的服務帳戶金鑰與權限範圍
+SERVICE_ACCOUNT_FILE = os.getenv("PATH_TO_GOOGLE_JSON")
+SHEETS_SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+
+# 所有外部資源（Neo4j driver、嵌入模型、Google API 客戶端）都在第一次使用時才建立，
+# import 任何模組都不會連線或載入模型；需要預先載入時呼叫 warmup()
+_lock = threading.RLock()
+_resources: Dict[Tuple[str, str], Any] = {}
+
+def _get(kind: str, key: str, factory: Callable[[], Any]) -> Any:
+    with _lock:
+        resource = _resources.get((kind, key))
+        if resource is None:
+            resource = factory()
+            _resources[(kind, key)] = resource
+        return resource
+
+def get_driver(dataset: str):
+    """回傳資料集共用的 Neo4j driver；同一個 URI 只會建立一個連線池。"""
+    uri = os.getenv(f"NEO4J_URI_{dataset}")
+
+    def create():
+        from neo4j import GraphDatabase
+        return GraphDatabase.driver(uri, auth=(os.getenv("NEO4J_USERNAME"), os.getenv(f"NEO4J_PASSWORD_{dataset}")))
+
+    return _get("neo4j", uri, create)
+
+def get_encoder(model_name: str = MODEL_NAME):
+    """回傳整個行程共用的 SentenceTransformer，同一個模型只載入一次。"""
+
+    def create():
+        # 只有需要編碼時才載入 sentence_transformers（連帶載入 torch）
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+
+    return _get("encoder", model_name, create)
+
+def get_sheets(service_account_file: str = SERVICE_ACCOUNT_FILE):
+    """回傳 Google Sheets 的 spreadsheets() 資源。"""
+
+    def create():
+        from google.oauth2.service_account import Credentials
+        from googleapiclient.discovery import build
+        creds = Credentials.from_service_account_file(service_account_file, scopes=SHEETS_SCOPES)
+        return build('sheets', 'v4', credentials=creds).spreadsheets()
+
+    return _get("sheets", service_account_file, create)
+
+def warmup(datasets: Iterable[str] = ("3068",), encoder: bool = True, sheets: bool = False) -> Dict[str, float]:
+    """
+    預先建立資源並確認可用，避免第一個請求承擔初始化時間。
+
+    Args:
+        datasets: 要建立連線並確認可連上的 Neo4j 資料集。
+        encoder (bool): 是否載入嵌入模型並執行一次編碼。
+        sheets (bool): 是否建立 Google Sheets 客戶端。
+
+    Returns:
+        Dict[str, float]: 每項資源的初始化耗時（秒）。
+    """
+    timings = {}
+    for dataset in datasets:
+        start = time.perf_counter()
+        get_driver(dataset).verify_connectivity()
+        timings[f"neo4j:{dataset}"] = time.perf_counter() - start
+    if encoder:
+        start = time.perf_counter()
+        get_encoder().encode(["warmup"], show_progress_bar=False)
+        timings["encoder"] = time.perf_counter() - start
+    if sheets:
+        start = time.perf_counter()
+        get_sheets()
+        timings["sheets"] = time.perf_counter() - start
+    return timings
+
+def close_all() -> None:
+    """關閉所有已建立的 Neo4j driver 並清空登錄，之後使用時會重新建立。"""
+    with _lock:
+        for (kind, _), resource in _resources.items():
+            if kind == "neo4j":
+                resource.close()
+        _resources.clear()
+
+def _forget_after_fork() -> None:
+    # 子行程不能沿用父行程的連線，只清空登錄而不關閉父行程的 socket
+    global _lock
+    _lock = threading.RLock()
+    _resources.clear()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_after_fork)
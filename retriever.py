@@ -0,0 +1,274 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+import faiss
+import numpy as np
+from dotenv import load_dotenv
+from embedding_cache import get_embedding_cache
+from index_factory import build_index
+from index_store import (DEFAULT_FIELD, EMBED_FIELDS, field_dir, group_by_case_type, load_manifest, load_shard,
+                         load_unified, neighbour_types, resolve_index_dir, write_shard)
+from Neo4j_Query import find_reason_embeddings
+from resources import DATASETS, MODEL_NAME, get_driver, get_encoder
+
+# 加載 .env 配置
+load_dotenv()
+
+MAX_CACHE_SIZE = 5  # 每個資料集最多 cache 幾個索引
+# 設定 FAISS_UNIFIED_INDEX=1 時改用包含所有案件類型的單一索引（需以 build_index.py --unified 構建）
+USE_UNIFIED_INDEX = os.getenv("FAISS_UNIFIED_INDEX", "0") == "1"
+# 單一索引篩選後結果不足 top_k 時，是否擴大到相近的案件類型
+USE_TYPE_FALLBACK = os.getenv("FAISS_TYPE_FALLBACK", "1") != "0"
+# 多欄位檢索時各欄位的權重，以及 reciprocal rank fusion 的平滑常數
+FIELD_WEIGHTS = {"事故發生緣由": 1.0, "受傷情形": 1.0, "賠償根據": 1.0}
+RRF_K = 60
+
+class Retriever:
+    """
+    單一資料集的案件檢索：以事故發生緣由查詢，或以 search_fields 同時查詢多個欄位。
+
+    嵌入模型與 Neo4j driver 由 resources 在整個行程中共用，每個 Retriever 只各自保留索引快取，
+    因此同時服務多個資料集時不會重複載入模型。
+    """
+
+    def __init__(self, dataset: str, index_path: Optional[str] = None, max_cache_size: int = MAX_CACHE_SIZE,
+                 use_unified: bool = USE_UNIFIED_INDEX, use_fallback: bool = USE_TYPE_FALLBACK):
+        self.dataset = dataset
+        self.index_path = index_path or DATASETS[dataset]
+        self.use_unified = use_unified
+        self.use_fallback = use_fallback
+        # 快取以 (索引目錄, 案件類型, 欄位) 為鍵，離線構建切換版本後會自動改用新索引
+        self._load_index = lru_cache(maxsize=max_cache_size)(self._read_index)
+        self._load_unified = lru_cache(maxsize=2)(load_unified)
+
+    @property
+    def driver(self):
+        return get_driver(self.dataset)
+
+    @property
+    def model(self):
+        return get_encoder(MODEL_NAME)
+
+    def build_faiss_indexes(self, case_types: Optional[List[str]] = None) -> Dict[str, Tuple[faiss.Index, List[str], List[str]]]:
+        """
+        從 Neo4j 數據庫中構建每個 case_type 的 FAISS 索引並保存到磁盤。
+
+        只用於沒有版本化索引集合的舊目錄；正式的索引請以 build_index.py 離線構建。
+
+        Args:
+            case_types (Optional[List[str]]): 只構建這些案件類型的索引，預設為全部。
+                指定的類型若沒有任何資料，會留下空索引標記，之後查詢時不會再重建。
+
+        Returns:
+            Dict[str, Tuple[faiss.Index, List[str], List[str]]]: 每個 case_type 對應的 FAISS 索引，案件 ID 列表，事故緣由文本列表。
+        """
+        with self.driver.session() as session:
+            records = session.execute_read(find_reason_embeddings, case_types)
+
+        # 創建存儲目錄（如果不存在）
+        os.makedirs(self.index_path, exist_ok=True)
+
+        indexes = {}
+        for case_type, data in group_by_case_type(records).items():
+            index, _ = build_index(np.vstack(data['embeddings']))
+            # 保存索引到磁盤
+            write_shard(self.index_path, case_type, index, data['case_ids'], data['reason_texts'])
+            indexes[case_type] = (index, data['case_ids'], data['reason_texts'])
+
+            # 之前標記為空的類型現在有資料了
+            empty_path = os.path.join(self.index_path, f"{case_type}_empty")
+            if os.path.exists(empty_path):
+                os.remove(empty_path)
+
+        # 記錄沒有資料的案件類型
+        for case_type in case_types or []:
+            if case_type not in indexes:
+                open(os.path.join(self.index_path, f"{case_type}_empty"), "w").close()
+
+        return indexes
+
+    @contextmanager
+    def index_build_lock(self, case_type: str, timeout: float = 600):
+        """
+        以建立鎖定檔的方式避免多個行程同時重建同一個案件類型的索引。
+        超過 timeout 秒仍未釋放的鎖定檔視為前一個行程已中斷，直接接手。
+        """
+        os.makedirs(self.index_path, exist_ok=True)
+        lock_path = os.path.join(self.index_path, f"{case_type}.lock")
+        while True:
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock_path) > timeout:
+                        os.remove(lock_path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                time.sleep(0.2)
+        try:
+            yield
+        finally:
+            os.close(fd)
+            os.remove(lock_path)
+
+    def load_index(self, case_type: str, field: str = DEFAULT_FIELD) -> Tuple[faiss.Index, List[str], List[str]]:
+        # 每次都依 CURRENT 找出目前的索引目錄
+        return self._load_index(resolve_index_dir(self.index_path), case_type, field)
+
+    def _read_index(self, index_dir: str, case_type: str, field: str = DEFAULT_FIELD) -> Tuple[faiss.Index, List[str], List[str]]:
+        if field != DEFAULT_FIELD:
+            # 其他欄位的索引只由 build_index.py 離線構建，不在查詢時重建
+            shard = load_shard(field_dir(index_dir, field), case_type)
+            return shard if shard is not None else (None, [], [])
+        empty_path = os.path.join(index_dir, f"{case_type}_empty")
+
+        def load():
+            shard = load_shard(index_dir, case_type)
+            if shard is not None:
+                return shard
+            # 版本化的索引集合是完整的，缺少的類型代表沒有資料
+            if os.path.exists(empty_path) or load_manifest(index_dir) is not None:
+                return None, [], []
+            return None
+
+        loaded = load()
+        if loaded is not None:
+            return loaded
+        # 索引不存在時只重建這個案件類型，並在取得鎖後再確認一次是否已被其他行程建好
+        with self.index_build_lock(case_type):
+            loaded = load()
+            if loaded is not None:
+                return loaded
+            indexes = self.build_faiss_indexes([case_type])
+            return indexes.get(case_type, (None, [], []))
+
+    def load_unified(self):
+        return self._load_unified(resolve_index_dir(self.index_path))
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        # 相同文本的向量由共用快取取得，不必重新編碼；全部命中時不會載入模型
+        return get_embedding_cache(MODEL_NAME).encode(lambda: self.model, texts)
+
+    def query(self, input_text: str, case_type: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        """
+        在指定 case_type 的 FAISS 索引中查詢最相似的案件。
+
+        Args:
+            input_text (str): 用戶輸入的文本。
+            case_type (str): 案件類型。
+            top_k (int): 返回的最相似事實數量。
+
+        Returns:
+            List[Dict[str, Any]]: 包含最相似事實的 ID、文本和距離的列表。
+        """
+        return self.query_batch([input_text], [case_type], top_k)[0]
+
+    def query_batch(self, texts: List[str], case_types: List[str], top_k: int = 5) -> List[List[Dict[str, Any]]]:
+        """
+        一次查詢多筆文本：所有文本以單一 batch 編碼，再依案件類型分組，每個索引只搜尋一次。
+
+        Args:
+            texts (List[str]): 用戶輸入的文本。
+            case_types (List[str]): 每筆文本對應的案件類型。
+            top_k (int): 每筆文本返回的最相似事實數量。
+
+        Returns:
+            List[List[Dict[str, Any]]]: 依輸入順序排列，每筆為 query 格式的結果。
+        """
+        if len(texts) != len(case_types):
+            raise ValueError("texts 與 case_types 的數量必須相同")
+        if not texts:
+            return []
+        query_embeddings = self.encode(texts)
+
+        # 單一索引存在時以案件類型篩選搜尋，沒有時退回每個案件類型各自的索引
+        unified = self.load_unified() if self.use_unified else None
+        if unified is not None:
+            return unified.search(query_embeddings, case_types, top_k, neighbour_types if self.use_fallback else None)
+
+        # 依案件類型分組
+        positions_by_type: Dict[str, List[int]] = {}
+        for position, case_type in enumerate(case_types):
+            positions_by_type.setdefault(case_type, []).append(position)
+
+        results: List[List[Dict[str, Any]]] = [[] for _ in texts]
+        for case_type, positions in positions_by_type.items():
+            index, case_ids, reason_texts = self.load_index(case_type)
+            if index is None:
+                continue
+            distances, indices = index.search(query_embeddings[positions], top_k)
+            for position, row_distances, row_indices in zip(positions, distances, indices):
+                results[position] = format_hits(row_distances, row_indices, case_ids, reason_texts)
+        return results
+
+    def search_fields(self, sections: Dict[str, str], case_type: str, top_k: int = 5,
+                      weights: Optional[Dict[str, float]] = None, candidates: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        以一筆輸入的多個部分同時檢索，並依案件融合各欄位的結果。
+
+        所有部分的文本以單一 batch 編碼，每個欄位的索引各搜尋一次，
+        再以加權的 reciprocal rank fusion（weight / (RRF_K + 名次)）累加每個案件的分數。
+        以名次而非距離融合，不同欄位的距離尺度不一致也不影響結果。
+
+        Args:
+            sections (Dict[str, str]): 欄位名稱（事故發生緣由、受傷情形、賠償根據）對應的文本，空文本會略過。
+            case_type (str): 案件類型。
+            top_k (int): 返回的案件數量。
+            weights (Optional[Dict[str, float]]): 各欄位的權重，預設為 FIELD_WEIGHTS。
+            candidates (Optional[int]): 每個欄位取回的候選數，預設為 top_k 的 4 倍（至少 20）。
+
+        Returns:
+            List[Dict[str, Any]]: 依分數由高到低排列，每筆含 id、score，
+            以及 fields：命中的欄位對應的 text、distance、rank。
+        """
+        unknown = set(sections) - set(EMBED_FIELDS)
+        if unknown:
+            raise ValueError(f"沒有這些欄位的索引：{sorted(unknown)}")
+        weights = weights or FIELD_WEIGHTS
+        candidates = candidates or max(top_k * 4, 20)
+        fields = [field for field, text in sections.items() if text and text.strip()]
+        if not fields:
+            return []
+        vectors = self.encode([sections[field] for field in fields])
+
+        fused: Dict[int, Dict[str, Any]] = {}
+        for field, vector in zip(fields, vectors):
+            index, case_ids, reason_texts = self.load_index(case_type, field)
+            if index is None:
+                continue
+            distances, indices = index.search(vector[None, :], candidates)
+            for rank, hit in enumerate(format_hits(distances[0], indices[0], case_ids, reason_texts), start=1):
+                entry = fused.setdefault(hit["id"], {"id": hit["id"], "score": 0.0, "fields": {}})
+                entry["score"] += weights.get(field, 1.0) / (RRF_K + rank)
+                entry["fields"][field] = {"text": hit["text"], "distance": hit["distance"], "rank": rank}
+        return sorted(fused.values(), key=lambda entry: entry["score"], reverse=True)[:top_k]
+
+def format_hits(distances, indices, case_ids, reason_texts) -> List[Dict[str, Any]]:
+    results = []
+    for dist, idx in zip(distances, indices):
+        # 索引中的向量少於 top_k 時 FAISS 會以 -1 補齊
+        if idx < 0:
+            continue
+        results.append({
+            "id": int(case_ids[idx]),
+            "text": reason_texts[idx],
+            "distance": float(dist)
+        })
+    return results
+
+_retrievers: Dict[str, Retriever] = {}
+_retrievers_lock = threading.Lock()
+
+def get_retriever(dataset: str) -> Retriever:
+    """回傳資料集共用的 Retriever。"""
+    with _retrievers_lock:
+        retriever = _retrievers.get(dataset)
+        if retriever is None:
+            retriever = Retriever(dataset)
+            _retrievers[dataset] = retriever
+        return retriever
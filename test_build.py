@@ -0,0 +1,31 @@
+import random
+import threading
+import time
+from collections import Counter
+from KG_Build_B import classify_rows
+
+def fake_classifier():
+    calls = Counter()
+    lock = threading.Lock()
+
+    def classify(sim_input):
+        with lock:
+            calls[sim_input] += 1
+        # 讓後送出的分類有機會先完成
+        time.sleep(random.uniform(0, 0.01))
+        defendants = ["甲", "乙"] if sim_input.endswith("0") else ["甲"]
+        return {"plaintiffs": ["原告"], "defendants": defendants, "minor": False, "employee": False, "animal": False}
+
+    return classify, calls
+
+def test_classify_rows_keeps_order_and_classifies_once():
+    classify, calls = fake_classifier()
+    rows = [{"case_id": i, "sim_input": f"案件{i}"} for i in range(1, 51)]
+    results = list(classify_rows(iter(rows), classify=classify, max_workers=4))
+
+    assert [row["case_id"] for row in results] == list(range(1, 51))
+    assert calls == Counter({row["sim_input"]: 1 for row in rows})
+    for row in results:
+        expected = "數名被告" if row["sim_input"].endswith("0") else "單純原被告各一"
+        assert row["case_type"] == expected
+        assert row["attribute"].startswith("原告:原告\n")
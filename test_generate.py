@@ -0,0 +1,101 @@
+import asyncio
+import threading
+from typing import Any, AsyncIterator, List, Optional
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+from pydantic import PrivateAttr
+import KG_Generate
+
+USER_INPUT = """
+一、事故發生緣由:
+被告駕車未注意車前狀況，撞擊原告機車。
+二、原告受傷情形:
+原告受有骨折。
+三、請求賠償的事實根據:
+醫療費用1萬元。
+"""
+
+class LoopBoundLLM(LLM):
+    """假的 LLM，和 OllamaLLM 的非同步客戶端一樣只能在第一次使用時的事件迴圈中呼叫。"""
+
+    _loop: Any = PrivateAttr(default=None)
+
+    @property
+    def _llm_type(self) -> str:
+        return "loop-bound-fake"
+
+    def _check_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is None:
+            self._loop = loop
+        elif self._loop is not loop:
+            raise RuntimeError("Event loop is closed")
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> str:
+        return "段落"
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> str:
+        self._check_loop()
+        return "段落"
+
+    async def _astream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None,
+                       **kwargs) -> AsyncIterator[GenerationChunk]:
+        self._check_loop()
+        for text in ("段", "落"):
+            yield GenerationChunk(text=text)
+
+def fake_pipeline(monkeypatch):
+    monkeypatch.setattr(KG_Generate, "default_llm", LoopBoundLLM)
+    monkeypatch.setattr(KG_Generate, "get_case_type", lambda user_input: "單純原被告各一")
+    monkeypatch.setattr(KG_Generate, "find_legal_references", lambda case_facts, case_type: ["民法第184條"])
+
+def test_shared_llm_fails_across_event_loops():
+    llm = LoopBoundLLM()
+    asyncio.run(llm.ainvoke("a"))
+    try:
+        asyncio.run(llm.ainvoke("b"))
+    except RuntimeError:
+        return
+    raise AssertionError("假的 LLM 應該拒絕在另一個事件迴圈中使用")
+
+def test_generate_lawsuit_twice_in_one_process(monkeypatch):
+    fake_pipeline(monkeypatch)
+    for _ in range(2):
+        assert KG_Generate.generate_lawsuit(USER_INPUT) == "段落\n\n段落\n\n段落"
+
+class EndlessLLM(LoopBoundLLM):
+    """不斷輸出片段直到被取消的假 LLM。"""
+
+    async def _astream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None,
+                       **kwargs) -> AsyncIterator[GenerationChunk]:
+        self._check_loop()
+        try:
+            while True:
+                await asyncio.sleep(0.01)
+                yield GenerationChunk(text="段")
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+cancelled = threading.Event()
+
+def test_stream_lawsuit_twice_in_one_process(monkeypatch):
+    fake_pipeline(monkeypatch)
+    for _ in range(2):
+        stream = KG_Generate.stream_lawsuit(USER_INPUT)
+        events = list(stream)
+        assert [event["section"] for event in events if event["event"] == "section"] == list(KG_Generate.SECTION_ORDER)
+        assert events[-1]["event"] == "done"
+        assert stream.document == "段落\n\n段落\n\n段落"
+        assert stream.stats["fact"]["tokens"] == 2
+
+def test_closing_stream_cancels_generation(monkeypatch):
+    fake_pipeline(monkeypatch)
+    monkeypatch.setattr(KG_Generate, "default_llm", EndlessLLM)
+    cancelled.clear()
+    events = iter(KG_Generate.stream_lawsuit(USER_INPUT))
+    for event in events:
+        if event["event"] == "token":
+            break
+    events.close()
+    assert cancelled.wait(timeout=5)
@@ -0,0 +1,43 @@
+import os
+from typing import Any, List, Sequence, Union
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 嵌入向量寫入 Neo4j 的格式：
+#   list   浮點數列表（Neo4j 以 64-bit double 儲存，768 維約 6 KB）
+#   fp16   1 byte 格式標記 + float16 位元組（約 1.5 KB）
+#   sq8    1 byte 格式標記 + float32 縮放係數 + int8 位元組（約 0.8 KB）
+# 讀取時依值的型別與格式標記自動判斷，因此新舊格式可以同時存在於圖中
+EMBEDDING_FORMATS = ("list", "fp16", "sq8")
+EMBEDDING_FORMAT = os.getenv("EMBEDDING_FORMAT", "list")
+
+_FP16_TAG = 1
+_SQ8_TAG = 2
+
+def encode_embedding(vector: Sequence[float], fmt: str = EMBEDDING_FORMAT) -> Union[List[float], bytes]:
+    """將向量轉成要寫入節點的屬性值。"""
+    vector = np.asarray(vector, dtype="float32")
+    if fmt == "list":
+        return vector.tolist()
+    if fmt == "fp16":
+        return bytes([_FP16_TAG]) + vector.astype("<f2").tobytes()
+    if fmt == "sq8":
+        # 對稱量化：以絕對值最大的分量對應 127
+        scale = float(np.abs(vector).max()) / 127 or 1.0
+        codes = np.clip(np.rint(vector / scale), -127, 127).astype("int8")
+        return bytes([_SQ8_TAG]) + np.float32(scale).astype("<f4").tobytes() + codes.tobytes()
+    raise ValueError(f"未知的嵌入格式：{fmt}")
+
+def decode_embedding(value: Any) -> np.ndarray:
+    """將節點上的 embedding 屬性還原成 float32 向量，支援所有 EMBEDDING_FORMATS。"""
+    if not isinstance(value, (bytes, bytearray)):
+        return np.asarray(value, dtype="float32")
+    tag, payload = value[0], bytes(value[1:])
+    if tag == _FP16_TAG:
+        return np.frombuffer(payload, dtype="<f2").astype("float32")
+    if tag == _SQ8_TAG:
+        scale = np.frombuffer(payload[:4], dtype="<f4")[0]
+        return np.frombuffer(payload[4:], dtype="int8").astype("float32") * scale
+    raise ValueError(f"未知的嵌入格式標記：{tag}")